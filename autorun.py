@@ -1,7 +1,100 @@
-from updaters import run_all, set_client
-from mwcleric import AuthCredentials, WikiggClient
+import argparse
+from datetime import datetime, timedelta
+
+from updaters import (PROFILE_MODES, print_import_times, profile_all, render_all, run_all, run_changed, set_backend,
+                      set_client, set_metrics_files, set_parse_processes, watch)
+
+
+def deadline(time: str) -> datetime:
+    # The next time the clock reads HH:MM, today or tomorrow
+    moment = datetime.combine(datetime.now().date(), datetime.strptime(time, "%H:%M").time())
+    return moment if moment > datetime.now() else moment + timedelta(days=1)
+
+
+def connect(async_client: bool):
+    """
+    Log in to the wiki, through the asyncio client or through mwcleric.
+
+    :return: The asyncio client, which has to be closed after the run, or None
+    """
+    # mwcleric takes long to import, it is only imported once a run talks to the wiki
+    from mwcleric import AuthCredentials, WikiggClient
+
+    credentials = AuthCredentials(user_file="me")
+    if async_client:
+        from updaters.async_backend import AsyncBackend
+        backend = AsyncBackend(username=credentials.username, password=credentials.password)
+        set_backend(backend)
+        return backend
+    set_client(WikiggClient("astronomics", credentials=credentials))
+    return None
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the update scripts selected in updaters/__init__.py.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip the pages a failed earlier run already finished")
+    parser.add_argument("--max-edits", type=int, default=None,
+                        help="Stop after this many edits, new pages go first, "
+                             "then infobox updates, then database updates")
+    parser.add_argument("--deadline", type=deadline, default=None, metavar="HH:MM",
+                        help="Stop at this time, the pages left over are done by the next run")
+    # Ways to run instead of running the selected update scripts on every page
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument("--changed", action="store_true",
+                       help="Only update the pages made from rows that changed since the last successful run")
+    modes.add_argument("--watch", action="store_true",
+                       help="Keep running, and update the pages of every data file that changes, like autowatch.py")
+    modes.add_argument("--render-dir", default=None, metavar="DIR",
+                       help="Write every page to files in this directory instead of saving them, without logging in. "
+                            "Every page is rendered as a new page, see --render-updates")
+    modes.add_argument("--profile", choices=PROFILE_MODES, default=None,
+                       help="Run the updaters one at a time under a profiler")
+    parser.add_argument("--profile-dir", default="profiles", help="Directory the profiles are written to")
+    parser.add_argument("--profile-top", type=int, default=20, help="Hot functions to list per updater")
+    parser.add_argument("--render-updates", action="store_true",
+                        help="Log in and read the wiki with --render-dir, and write the pages that exist "
+                             "as the infobox updates would change them")
+    parser.add_argument("--updater", default=None, help="Only profile this updater, like resources")
+    parser.add_argument("--async-client", action="store_true",
+                        help="Talk to the wiki through the asyncio client, with many reads in flight at once")
+    parser.add_argument("--parse-processes", type=int, default=0,
+                        help="Parse and rewrite fetched pages on this many processes, using more cores")
+    parser.add_argument("--metrics-json", default=None, metavar="PATH",
+                        help="Write what the run cost per updater and stage to this JSON file")
+    parser.add_argument("--metrics-prom", default=None, metavar="PATH",
+                        help="Write the same metrics to this Prometheus textfile")
+    parser.add_argument("--import-times", action="store_true", help="Show how long importing every module took")
+    args = parser.parse_args()
+    if args.updater is not None and args.profile is None:
+        parser.error("--updater can only be used with --profile")
+    if args.render_updates and args.render_dir is None:
+        parser.error("--render-updates can only be used with --render-dir")
+    selected_run = not (args.changed or args.watch or args.profile is not None or args.render_dir is not None)
+    if (args.max_edits is not None or args.deadline is not None) and not selected_run:
+        parser.error("--max-edits and --deadline only apply to a run of the selected update scripts")
+
     # Run update scripts in order
-    set_client(WikiggClient("astronomics", credentials=AuthCredentials(user_file="me")))
-    run_all()
+    # Rendering offline doesn't log in
+    async_backend = None
+    if args.render_dir is None or args.render_updates:
+        async_backend = connect(args.async_client)
+    set_parse_processes(args.parse_processes)
+    set_metrics_files(args.metrics_json, args.metrics_prom)
+    try:
+        if args.profile is not None:
+            profile_all(args.profile, args.profile_dir, args.profile_top, args.updater)
+        elif args.changed:
+            run_changed(resume=args.resume)
+        elif args.watch:
+            watch()
+        elif args.render_dir is not None:
+            render_all(args.render_dir, args.render_updates)
+        else:
+            run_all(resume=args.resume, max_edits=args.max_edits, deadline=args.deadline)
+    finally:
+        # Sends the edits still queued before the connections are closed
+        if async_backend is not None:
+            async_backend.close()
+    if args.import_times:
+        print_import_times()
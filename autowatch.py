@@ -0,0 +1,9 @@
+from updaters import set_client, watch
+
+if __name__ == "__main__":
+    # mwcleric takes long to import, it is only imported once the watcher logs in
+    from mwcleric import AuthCredentials, WikiggClient
+
+    # Log in once, then update pages whenever the data files change
+    set_client(WikiggClient("astronomics", credentials=AuthCredentials(user_file="me")))
+    watch()
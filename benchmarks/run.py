@@ -0,0 +1,179 @@
+"""
+Benchmark the stages of every updater on the real data and on larger synthetic data sets, against a local wiki.
+
+Usage: python -m benchmarks.run [--scales 1 10 100 1000] [--seed N] [--label NAME] [--no-memory] [--parse-processes N]
+
+Results are written to benchmarks/results/<label>.json and compared with the previous results file.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Dict, Optional
+
+import updaters
+from updaters import dataset, util
+from updaters.backend import LocalBackend
+
+from .synthetic import generate
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# A stage taking this much longer than in the previous results is reported as a regression
+REGRESSION_THRESHOLD = 1.2
+
+
+def default_label() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def measure(stage: Callable[[], object], backend: LocalBackend, memory: bool) -> dict:
+    """
+    Run a single stage, and return its result with the time, memory and API calls it took.
+    """
+    backend.calls.clear()
+    if memory:
+        tracemalloc.start()
+
+    start = perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = stage()
+    elapsed = perf_counter() - start
+
+    metrics = {"seconds": elapsed, "api_calls": dict(backend.calls)}
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        metrics["allocated_kib"] = current / 1024
+        metrics["peak_kib"] = peak / 1024
+    metrics["result"] = result
+    return metrics
+
+
+def benchmark_updater(updater, memory: bool) -> Dict[str, dict]:
+    backend = LocalBackend()
+    util.set_backend(backend)
+    stages = {}
+
+    def parse():
+        dataset.loaded_sheets.clear()
+        return updater.collect_pages()
+
+    stages["parse"] = measure(parse, backend, memory)
+    pages = stages["parse"].pop("result")
+    titles = updater.database_titles()
+
+    stages["plan"] = measure(lambda: util.prefetch_existence(titles), backend, memory)
+    stages["render"] = measure(lambda: len(updater.render_pages(pages)), backend, memory)
+
+    # Against an empty wiki every page is created, after that every page exists and gets its infobox updated
+    util.reset_existence()
+    stages["create"] = measure(updater.run, backend, memory)
+    util.reset_existence()
+    stages["update"] = measure(updater.run, backend, memory)
+
+    for stage in stages.values():
+        stage.pop("result", None)
+    stages["parse"]["pages"] = len(titles)
+    return stages
+
+
+def run_benchmarks(scales, seed: int, memory: bool, parse_processes: int = 0) -> dict:
+    updaters.set_rate_limits(1e9, 1e9)
+    updaters.set_concurrency(1)
+    updaters.set_parse_processes(parse_processes)
+    dataset.set_snapshots(False)
+
+    results = {}
+    source_dir = dataset.data_dir
+    try:
+        for scale in scales:
+            with tempfile.TemporaryDirectory() as data_dir:
+                # Scale 1 is the real data, the other scales a synthetic data set of that many times its size
+                if scale == 1:
+                    dataset.set_data_dir(source_dir)
+                else:
+                    generate(data_dir, seed, scale)
+                    dataset.set_data_dir(data_dir)
+
+                results[str(scale)] = {}
+                for name in updaters.incremental_updaters:
+                    print(f"{scale}x {name}...")
+                    results[str(scale)][name] = benchmark_updater(updaters.load_updater(name), memory)
+    finally:
+        dataset.set_data_dir(source_dir)
+        dataset.set_snapshots(True)
+        updaters.set_parse_processes(0)
+    return results
+
+
+def previous_results(label: str) -> Optional[dict]:
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = [os.path.join(RESULTS_DIR, f) for f in os.listdir(RESULTS_DIR)
+             if f.endswith(".json") and f != label + ".json"]
+    if not files:
+        return None
+    with open(max(files, key=os.path.getmtime)) as f:
+        return json.load(f)
+
+
+def print_results(results: dict, previous: Optional[dict]) -> None:
+    print(f"{'scale':>6} {'updater':<10} {'stage':<7} {'pages':>7} {'seconds':>9} {'peak KiB':>10} {'calls':>7}"
+          f"  change")
+    for scale, scale_results in results["scales"].items():
+        for name, stages in scale_results.items():
+            for stage, metrics in stages.items():
+                change = ""
+                try:
+                    before = previous["scales"][scale][name][stage]["seconds"]
+                except (KeyError, TypeError):
+                    before = None
+                if before:
+                    ratio = metrics["seconds"] / before
+                    change = f"{ratio - 1:+.0%}" + (" REGRESSION" if ratio > REGRESSION_THRESHOLD else "")
+                print(f"{scale + 'x':>6} {name:<10} {stage:<7} {stages['parse']['pages']:>7} "
+                      f"{metrics['seconds']:>9.4f} {metrics.get('peak_kib', 0):>10.0f} "
+                      f"{sum(metrics['api_calls'].values()):>7}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every updater against a local wiki.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000],
+                        help="Sizes of the data sets relative to the real data, 1 is the real data")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data sets")
+    parser.add_argument("--label", default=None, help="Name of the results file, the git version by default")
+    parser.add_argument("--no-memory", action="store_true", help="Don't trace allocations, which slows down stages")
+    parser.add_argument("--parse-processes", type=int, default=0,
+                        help="Parse and rewrite pages on this many processes, 0 parses them in the benchmark itself")
+    args = parser.parse_args()
+
+    label = args.label or default_label()
+    results = {
+        "label": label,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "parse_processes": args.parse_processes,
+        "scales": run_benchmarks(args.scales, args.seed, not args.no_memory, args.parse_processes),
+    }
+    print_results(results, previous_results(label))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, label + ".json"), "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
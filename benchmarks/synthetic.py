@@ -0,0 +1,404 @@
+"""
+Generate a synthetic data set with the headers and cross references of the real sheets, at any size.
+
+Usage: python -m benchmarks.synthetic TARGET_DIR [--seed N] [--scale N] [--size NAME=COUNT ...]
+
+The same seed and sizes always give the same files, so benchmark runs on them can be compared.
+"""
+import argparse
+import csv
+import os
+from random import Random
+from typing import Dict, List, Optional, Set
+
+from updaters.dataset import SHEETS, Row
+
+# Rows per sheet and columns per repeated column group. The row counts are multiplied by the scale,
+# at scale 1 the data set is about the size of the real data. The column widths are never scaled.
+DEFAULT_SIZES = {
+    # Rows
+    "stations": 7,
+    "unreleased_stations": 1,
+    "contracts_per_station": 8,
+    "asteroids_per_station": 4,
+    "minerals": 25,
+    "liquids": 6,
+    "gems": 5,
+    "manufactured": 18,
+    "unreleased_resources": 2,
+    "bots": 2,
+    "deployables": 3,
+    "leveled_tools": 3,
+    "tools": 1,
+    "modifications": 8,
+    "structures": 11,
+    "machines": 4,
+    "recipes_per_machine": 10,
+    "upgrades": 9,
+    # Column widths
+    "tool_levels": 2,
+    "recipe_inputs": 4,
+    "recipe_products": 2,
+    "upgrade_levels": 3,
+    "upgrade_resources": 4,
+}
+
+# Sizes that are not multiplied by the scale
+WIDTHS = {"contracts_per_station", "asteroids_per_station", "recipes_per_machine", "tool_levels",
+          "recipe_inputs", "recipe_products", "upgrade_levels", "upgrade_resources"}
+
+SYLLABLES = ["ba", "cor", "dri", "fen", "gal", "hex", "ion", "ka", "lum", "mer", "nov", "or", "pra", "qui", "ros",
+             "sil", "tor", "ul", "ven", "wol", "xan", "yr", "zen"]
+
+WORDS = ["asteroid", "bot", "cargo", "crate", "deposit", "drill", "energy", "forge", "freighter", "heat", "iron",
+         "laser", "liquid", "mining", "pirate", "range", "resource", "rock", "shuttle", "station", "storage",
+         "surface", "turret", "worker"]
+
+COMPOSITIONS = ["Carbonite", "Metallic", "Silicate"]
+CREDIT_CLASSES = ["Undesirable", "Common", "Uncommon", "Rare"]
+SPECIAL_EFFECTS = ["", "", "", "Corrosive", "Flammable"]
+
+
+class NameMaker:
+    """
+    Made up names that are unique within one maker.
+    """
+    def __init__(self, rng: Random):
+        self.rng = rng
+        self.used: Set[str] = set()
+
+    def make(self, words: int = 1) -> str:
+        for _ in range(20):
+            name = " ".join(self.word() for _ in range(words))
+            if name not in self.used:
+                break
+        else:
+            # Running out of short names, number them
+            name = f"{self.word()} {len(self.used)}"
+        self.used.add(name)
+        return name
+
+    def word(self) -> str:
+        return "".join(self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(2, 3))).capitalize()
+
+
+def sentence(rng: Random, length: int = 8) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def sizes_for(scale: int, overrides: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    sizes = {name: count if name in WIDTHS else count * scale for name, count in DEFAULT_SIZES.items()}
+    sizes.update(overrides or {})
+    return sizes
+
+
+def generate(target_dir: str, seed: int = 0, scale: int = 1, sizes: Optional[Dict[str, int]] = None) -> None:
+    """
+    Write all seven sheets to the target directory.
+
+    :param seed: Seed of the random generator, the same seed gives the same data set
+    :param scale: Multiplier for the row counts of DEFAULT_SIZES
+    :param sizes: Row counts and column widths overriding the scaled defaults
+    """
+    sizes = sizes_for(scale, sizes)
+    rng = Random(seed)
+    names = NameMaker(rng)
+
+    stations = make_stations(rng, names, sizes)
+    released = [row for row in stations if row["Depth (kkm)"] != ""]
+    asteroids = make_asteroids(rng, released, sizes)
+    resources = make_resources(rng, names, sizes, asteroids)
+    equipment = make_equipment(rng, names, sizes, released)
+
+    # Salvage is named after the bots and deployables it comes from
+    resources += [resource_row(rng, f"{row['Name']} (Salvage)", "Salvage", "Wrecks", **{"Repair Cost": "50"})
+                  for row in equipment if row["Type"] in ["Bot", "Deployable"]]
+    resources.sort(key=lambda row: row["Name"])
+    resources = [resource_row(rng, "-", "Unknown", "")] + resources + [dict.fromkeys(resources[0], "")]
+
+    sheets = {
+        "asteroids": asteroid_sheet(asteroids, released),
+        "contracts": make_contracts(rng, stations, sizes, resources),
+        "equipment": equipment,
+        "recipes": make_recipes(rng, sizes, equipment, resources),
+        "resources": resources,
+        "stations": stations,
+        "upgrades": make_upgrades(rng, names, sizes, equipment, resources),
+    }
+
+    os.makedirs(target_dir, exist_ok=True)
+    for sheet, rows in sheets.items():
+        with open(os.path.join(target_dir, SHEETS[sheet]), "w", newline="") as f:
+            writer = csv.DictWriter(f, list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def make_stations(rng: Random, names: NameMaker, sizes: Dict[str, int]) -> List[Row]:
+    short_names = set()
+    stations = []
+    for i in range(sizes["stations"] + sizes["unreleased_stations"]):
+        name = names.make(2)
+        short_name = "".join(word[0] for word in name.split())
+        while short_name in short_names:
+            short_name += rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+        short_names.add(short_name)
+
+        released = i < sizes["stations"]
+        stations.append({
+            "Name": name,
+            "Short Name": short_name,
+            "Depth (kkm)": str(i * 1000 + rng.randint(0, 999)) if released else "",
+            "Refuel Cost": str(rng.choice([20, 25, 33.5, 50])) if released else "",
+            "Contracts": str(sizes["contracts_per_station"]) if released else "0",
+            "Max Reputation": str(sizes["contracts_per_station"]) if released else "0",
+        })
+    return stations
+
+
+def make_asteroids(rng: Random, stations: List[Row], sizes: Dict[str, int]) -> List[Row]:
+    # The resource columns are filled in by make_resources
+    asteroids = []
+    for station in stations:
+        for i in range(1, sizes["asteroids_per_station"] + 1):
+            composition = rng.choice(COMPOSITIONS)
+            asteroids.append({
+                "Internal id": f"Cluster_{composition}_{len(asteroids) + 1:02}",
+                "In-Game ID": f"{station['Short Name']}{i}",
+                "Composition": composition,
+                "Region": station["Name"],
+                "Pirate warning": str(rng.randint(0, 3)),
+                "Surface resource": [],
+                "Underground deposit (Common)": [],
+                "Underground deposit (Rare)": [],
+                "Liquids": [],
+                "Gasses": rng.choice(["", "-"]),
+            })
+    return asteroids
+
+
+def asteroid_sheet(asteroids: List[Row], stations: List[Row]) -> List[Row]:
+    empty = dict.fromkeys(asteroids[0], "")
+    # Composition headers, then per region a header, its station and its asteroids
+    rows = [dict(empty, **{"In-Game ID": header}) for header in ["All", "Carbonites", "Metallics", "Silicates"]]
+    for station in stations:
+        rows.append(dict(empty, **{"In-Game ID": station["Name"]}))
+        rows.append(dict(empty, **{"Internal id": station["Name"].replace(" ", "") + "Outpost",
+                                   "In-Game ID": station["Short Name"], "Composition": "Station",
+                                   "Region": station["Name"]}))
+        for row in asteroids:
+            if row["Region"] == station["Name"]:
+                rows.append({column: ", ".join(value) if isinstance(value, list) else value
+                             for column, value in row.items()})
+    return rows
+
+
+def resource_row(rng: Random, name: str, gameplay_type: str, found_at: str, **columns: str) -> Row:
+    credit_class = rng.choice(CREDIT_CLASSES)
+    return dict({
+        "Name": name,
+        "Abbreviation": name[:3].upper() if gameplay_type in ["Mineral", "Liquid", "Gem", "Remains"] else "",
+        "Credit Value Class": credit_class,
+        "Gameplay Type": gameplay_type,
+        "$ Value": str(rng.randint(5, 400) * 25),
+        "Credit Value": str([0.05, 0.2, 0.35, 0.5][CREDIT_CLASSES.index(credit_class)]),
+        "Repair Cost": "",
+        "Special Effect": "",
+        "Found at": found_at,
+    }, **columns)
+
+
+def make_resources(rng: Random, names: NameMaker, sizes: Dict[str, int], asteroids: List[Row]) -> List[Row]:
+    """
+    All resources except salvage, and fill in where on the asteroids the natural ones can be found.
+    """
+    def place(name: str, columns: List[str]) -> str:
+        found = rng.sample(asteroids, min(len(asteroids), rng.randint(1, 4)))
+        for asteroid in found:
+            asteroid[rng.choice(columns)].append(name)
+        return ", ".join(asteroid["In-Game ID"] for asteroid in found)
+
+    deposits = ["Surface resource", "Underground deposit (Common)", "Underground deposit (Rare)"]
+    resources = []
+    for _ in range(sizes["minerals"]):
+        name = names.make()
+        resources.append(resource_row(rng, name, "Mineral", place(name, deposits)))
+    for _ in range(sizes["liquids"]):
+        name = names.make()
+        resources.append(resource_row(rng, name, "Liquid", place(name, ["Liquids"]),
+                                      **{"Special Effect": rng.choice(SPECIAL_EFFECTS)}))
+    for _ in range(sizes["gems"]):
+        # Every gem comes whole and as remains, found at the same asteroids
+        name = names.make()
+        found_at = place(f"{name} (Flawless)", ["Surface resource"])
+        for asteroid in asteroids:
+            if asteroid["In-Game ID"] in found_at.split(", "):
+                asteroid[rng.choice(deposits[1:])].append(f"{name} (Cracked)")
+        resources.append(resource_row(rng, f"{name} (Flawless)", "Gem", found_at, **{"Special Effect": "Fragile"}))
+        resources.append(resource_row(rng, f"{name} (Cracked)", "Remains", found_at, **{"Special Effect": "Fragile"}))
+    for _ in range(sizes["manufactured"]):
+        resources.append(resource_row(rng, names.make(2), "Manufactured", "Manufactured"))
+    for _ in range(sizes["unreleased_resources"]):
+        resources.append(resource_row(rng, names.make(), rng.choice(["Unknown", "Mineral"]), "Upcoming"))
+    return resources
+
+
+def make_equipment(rng: Random, names: NameMaker, sizes: Dict[str, int], stations: List[Row]) -> List[Row]:
+    def row(name: str, equipment_type: str, console: str, tab: str, group: str = None, variant: str = "",
+            special_unlock: str = "", build_cost: str = "") -> Row:
+        return {
+            "Name": name,
+            "Group": group or name,
+            "Variant": variant,
+            "Type": equipment_type,
+            "Station Unlocked": rng.choice(stations)["Name"],
+            "Console": console,
+            "Tab": tab,
+            "Special Unlock": special_unlock,
+            "Price": "" if special_unlock else str(rng.randint(1, 50) * 100),
+            "Build Cost": build_cost,
+            "Short Description": sentence(rng, 4),
+            "In Game Description": sentence(rng, 12),
+            "Description": sentence(rng, 20),
+        }
+
+    # Salvage is matched to its equipment by name, so no bot or deployable name may contain another
+    salvageable = []
+
+    def salvageable_name(words: int) -> str:
+        while True:
+            name = names.make(words)
+            if not any(name in other or other in name for other in salvageable):
+                salvageable.append(name)
+                return name
+
+    equipment = []
+    for _ in range(sizes["leveled_tools"]):
+        group = names.make(2)
+        for level in range(1, sizes["tool_levels"] + 1):
+            equipment.append(row(f"{group} Lvl {level}", "Tool", "Command Bot", "Tools", group, f"Lvl {level}",
+                                 "Default" if level == 1 and rng.random() < 0.3 else ""))
+    for _ in range(sizes["tools"]):
+        equipment.append(row(names.make(2), "Tool", "Command Bot", "Tools"))
+    for _ in range(sizes["modifications"]):
+        equipment.append(row(names.make(2), "Modification", "Command Bot", "Modifications"))
+    for _ in range(sizes["bots"]):
+        equipment.append(row(salvageable_name(1), "Bot", "Equipment", "Equipment"))
+    for _ in range(sizes["deployables"]):
+        equipment.append(row(salvageable_name(2), "Deployable", "Equipment", "Equipment"))
+    for _ in range(sizes["structures"]):
+        equipment.append(row(names.make(2), "Structure", "Equipment", "Blueprints",
+                             special_unlock="Unlock Shuttle Forge" if rng.random() < 0.1 else "",
+                             build_cost=str(rng.randint(4, 12) * 5)))
+    for i in range(sizes["machines"]):
+        equipment.append(row(names.make(), "Manufacturing", "Equipment", "Manufacturing",
+                             special_unlock="Unlock Manufacturing Bay" if i == 0 else ""))
+    return equipment
+
+
+def make_contracts(rng: Random, stations: List[Row], sizes: Dict[str, int], resources: List[Row]) -> List[Row]:
+    deliverable = [row["Name"] for row in resources if row["Gameplay Type"] not in ["", "Unknown"]]
+    contracts = []
+    for station in stations:
+        station_id = station["Name"].upper().replace(" ", "_")
+        for _ in range(sizes["contracts_per_station"]):
+            resource = rng.choice(deliverable)
+            contracts.append({
+                "Station": station["Name"],
+                "Internal ID": f"CONTRACT_{station_id}_RESOURCE_{resource.upper().replace(' ', '_')}_{len(contracts)}",
+                "Title": f"{resource} Delivery",
+                "Required Quantity": str(rng.randint(1, 40) * 100),
+                "Reward": str(rng.randint(1, 20) * 50),
+                "Notes": sentence(rng, 6) if rng.random() < 0.3 else "",
+            })
+    return contracts
+
+
+def make_recipes(rng: Random, sizes: Dict[str, int], equipment: List[Row], resources: List[Row]) -> List[Row]:
+    usable = [row["Name"] for row in resources if row["Gameplay Type"] not in ["", "Unknown", "Salvage"]]
+    manufactured = [row["Name"] for row in resources if row["Gameplay Type"] == "Manufactured"]
+    machines = [row["Name"] for row in equipment if row["Type"] == "Manufacturing"]
+
+    recipes = []
+    for machine in machines:
+        for _ in range(sizes["recipes_per_machine"]):
+            products = rng.sample(manufactured, min(len(manufactured), rng.randint(1, sizes["recipe_products"])))
+            inputs = rng.sample(usable, min(len(usable), rng.randint(1, sizes["recipe_inputs"])))
+            recipe = {
+                "Identifier": "-".join(name[:3] for name in [machine] + inputs + products) + f"-{len(recipes)}",
+                "Machine": machine,
+                "Processing time": str(rng.choice([10, 25, 45, 60, 120])),
+            }
+            # Unused columns are "-" without a quantity, like in the real sheet
+            for i in range(1, sizes["recipe_products"] + 1):
+                recipe[f"Product {i} Name"] = products[i - 1] if i <= len(products) else "-"
+                recipe[f"Product {i} Quantity"] = str(rng.randint(1, 8) * 5) if i <= len(products) else ""
+            for i in range(1, sizes["recipe_inputs"] + 1):
+                recipe[f"Input {i} Name"] = inputs[i - 1] if i <= len(inputs) else "-"
+                recipe[f"Input {i} Quantity"] = str(rng.randint(1, 5) * 10) if i <= len(inputs) else ""
+            recipe["$ Change"] = str(rng.randint(-5000, 10000))
+            recipe["Credits Change"] = str(rng.randint(-4, 4) / 2)
+            recipe["Weight change"] = str(rng.randint(-50, 0))
+            recipes.append(recipe)
+    return recipes
+
+
+def make_upgrades(rng: Random, names: NameMaker, sizes: Dict[str, int], equipment: List[Row],
+                  resources: List[Row]) -> List[Row]:
+    usable = [row["Name"] for row in resources if row["Gameplay Type"] not in ["", "Unknown", "Salvage"]]
+    unlockable = [row for row in equipment if row["Type"] in ["Manufacturing", "Structure"]]
+
+    upgrades = []
+    for i in range(sizes["upgrades"]):
+        enable = i % 8 == 7
+        upgrade = {
+            "Name": ("Shuttle " if i % 2 else "") + names.make(),
+            "Description": sentence(rng, 10) if rng.random() < 0.7 else "",
+            "Affects": "Unlock" if enable else sentence(rng, 5),
+            "Lvl 0 Effect": "Disabled" if enable else f"{rng.randint(1, 10)} Slots",
+        }
+        # Enable upgrades have a single level, the last level of the others is not available yet
+        available = 1 if enable else rng.randint(1, max(1, sizes["upgrade_levels"] - 1))
+        for level in range(1, sizes["upgrade_levels"] + 1):
+            costs = rng.sample(usable, min(len(usable), rng.randint(1, sizes["upgrade_resources"]))) \
+                if level <= available else []
+            amounts = [str(rng.randint(1, 30) * 100) for _ in costs]
+            credits = str(rng.randint(4, 40) * 50) if level <= available else ""
+
+            upgrade[f"Lvl {level} Cost"] = "\n".join([f"{credits} Credits"] + [
+                f"{amount} {name}" for name, amount in zip(costs, amounts)]) if level <= available else "TBA"
+            upgrade[f"Lvl {level} Credits"] = credits
+            for res in range(1, sizes["upgrade_resources"] + 1):
+                upgrade[f"Lvl {level} Resource {res} Name"] = costs[res - 1] if res <= len(costs) else "-"
+                upgrade[f"Lvl {level} Resource {res} Amount"] = amounts[res - 1] if res <= len(costs) else ""
+            upgrade[f"Lvl {level} Cost Equivalent"] = str(rng.randint(400, 4000)) if level <= available else "0"
+
+            effect = "Enabled" if enable else f"{rng.randint(1, 10) * level} Slots"
+            if level <= available and rng.random() < 0.2:
+                unlock = rng.choice(unlockable)
+                effect += f"\nUnlock {unlock['Type']} - {unlock['Name']}"
+            upgrade[f"Lvl {level} Effect"] = effect
+        upgrades.append(upgrade)
+    return upgrades
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic data set for the updaters.")
+    parser.add_argument("target_dir", help="Directory to write the sheets to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier for the row counts")
+    parser.add_argument("--size", action="append", default=[], metavar="NAME=COUNT",
+                        help=f"Override a size, one of: {', '.join(DEFAULT_SIZES)}")
+    args = parser.parse_args()
+
+    sizes = {}
+    for size in args.size:
+        name, _, count = size.partition("=")
+        if name not in DEFAULT_SIZES or not count.isdigit():
+            parser.error(f"Invalid size {size}")
+        sizes[name] = int(count)
+    generate(args.target_dir, args.seed, args.scale, sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from updaters import LocalBackend, dataset, metrics, scheduler, set_backend, throttle, util
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def wiki(tmp_path, monkeypatch) -> LocalBackend:
+    """
+    A local wiki for every test, with the state files of the run in a directory of its own
+    and no waiting on rate limits or between retries.
+    """
+    monkeypatch.chdir(tmp_path)
+    dataset.set_data_dir(os.path.join(REPO_DIR, "data files"))
+    monkeypatch.setattr(throttle, "BACKOFF_BASE", 0.0)
+    throttle.set_rate_limits(1e6, 1e6)
+    workers = scheduler.workers
+
+    backend = LocalBackend()
+    set_backend(backend)
+    util.reset_report()
+    metrics.reset_metrics()
+    yield backend
+
+    scheduler.set_concurrency(workers)
+    metrics.set_metrics_files()
+    throttle.set_rate_limits()
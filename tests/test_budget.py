@@ -0,0 +1,67 @@
+import json
+import os
+
+import updaters
+from updaters import LocalBackend, set_backend
+from updaters.budget import REMAINDER_FILE, save_remainder
+
+UPDATERS = ["asteroids", "equipment", "resources", "stations", "upgrades"]
+
+
+def stale_wiki() -> LocalBackend:
+    # Every page exists, with outdated values in most of its infoboxes
+    reference = LocalBackend()
+    set_backend(reference)
+    updaters.run_all()
+    backend = LocalBackend()
+    backend.load_pages({title: text.replace("1", "7") for title, text in reference.pages().items()})
+    set_backend(backend)
+    return backend
+
+
+def test_budgeted_runs_continue_from_the_remainder(monkeypatch):
+    monkeypatch.setattr(updaters, "updaters_to_run", UPDATERS)
+    reference = LocalBackend()
+    set_backend(reference)
+    updaters.run_all()
+    backend = LocalBackend()
+    set_backend(backend)
+
+    updaters.run_all(max_edits=40)
+    assert backend.calls["edit"] == 40
+    with open(REMAINDER_FILE) as f:
+        remainder = json.load(f)
+    assert sum(len(pages) for updater, pages in remainder.items() if updater != "database") == 114 - 40
+    assert len(remainder["database"]) == 114
+
+    runs = 1
+    while os.path.exists(REMAINDER_FILE):
+        updaters.run_all(max_edits=40)
+        runs += 1
+        assert runs < 10
+    assert backend.pages() == reference.pages()
+    assert updaters.edit_report["failed"] == 0
+
+
+def test_spent_budget_stops_fetching_updates(monkeypatch):
+    monkeypatch.setattr(updaters, "updaters_to_run", ["resources"])
+    backend = stale_wiki()
+    backend.calls.clear()
+
+    updaters.run_all(workers=1, max_edits=2)
+
+    assert backend.calls["edit"] == 2
+    assert backend.calls["fetch"] == 1
+    with open(REMAINDER_FILE) as f:
+        remainder = json.load(f)
+    handled = updaters.edit_report["updated"] + updaters.edit_report["unchanged"]
+    assert len(remainder["resources"]) == 53 - handled
+
+
+def test_empty_remainder_entries_are_dropped():
+    save_remainder({"upgrades": [], "resources": ["Resource/Iron"]})
+    with open(REMAINDER_FILE) as f:
+        assert json.load(f) == {"resources": ["Resource/Iron"]}
+
+    save_remainder({"upgrades": []})
+    assert not os.path.exists(REMAINDER_FILE)
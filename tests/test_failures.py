@@ -0,0 +1,95 @@
+import json
+
+import updaters
+from updaters import LocalBackend, set_backend, throttle
+from updaters.backend import EditFailed
+from updaters.budget import REMAINDER_FILE
+from updaters.throttle import TransientError
+
+
+class FailingBackend(LocalBackend):
+    """
+    A wiki refusing every save of the given pages with a transient error.
+    """
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = set(failing)
+
+    def save(self, title: str, *args, **kwargs) -> None:
+        if title in self.failing:
+            raise TransientError("HTTP 503 Service Unavailable")
+        super().save(title, *args, **kwargs)
+
+
+def test_failed_save_is_recorded_and_left_for_the_next_run(monkeypatch):
+    monkeypatch.setattr(throttle, "MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(updaters, "updaters_to_run", ["resources"])
+    set_backend(FailingBackend(["Resource/Iron"]))
+
+    updaters.run_all(max_edits=1000)
+
+    assert updaters.failed_pages == {"Resource/Iron"}
+    assert updaters.edit_report["failed"] == 1
+    assert updaters.edit_report["created"] == 52
+    with open(REMAINDER_FILE) as f:
+        assert json.load(f) == {"resources": ["Resource/Iron"]}
+
+
+def test_failed_rows_are_tried_again_by_the_next_changed_run(monkeypatch):
+    monkeypatch.setattr(throttle, "MAX_ATTEMPTS", 1)
+    backend = FailingBackend(["Resource/Iron"])
+    set_backend(backend)
+    updaters.run_changed()
+    assert "Resource/Iron" in updaters.failed_pages
+
+    backend.failing.clear()
+    updaters.run_changed()
+    assert updaters.edit_report["created"] == 1
+    assert "Resource/Iron" in backend.pages()
+
+    updaters.run_changed()
+    assert sum(updaters.edit_report.values()) == 0
+
+
+def test_edit_conflict_fails_only_that_page(wiki):
+    updaters.load_updater("resources").run()
+    current = wiki.pages()
+    stale = {title: text.replace("1", "7") for title, text in current.items()}
+    backend = LocalBackend()
+    backend.load_pages(stale)
+    set_backend(backend)
+
+    fetch_many = backend.fetch_many
+    edited = []
+
+    def fetch_and_edit(titles):
+        pages = fetch_many(titles)
+        # Someone edits the first outdated page between the fetch and the save
+        outdated = [title for title in titles if stale[title] != current[title]]
+        if outdated:
+            backend.save(outdated[0], "Edited by hand", "")
+            edited.append(outdated[0])
+        return pages
+
+    backend.fetch_many = fetch_and_edit
+    updaters.load_updater("resources").run()
+
+    assert edited
+    assert updaters.failed_pages == set(edited)
+    assert all(backend.pages()[title] == "Edited by hand" for title in edited)
+    assert updaters.edit_report["updated"] > 0
+
+
+def test_refused_creation_does_not_stop_the_run(monkeypatch):
+    class RefusingBackend(LocalBackend):
+        def save(self, title: str, *args, **kwargs) -> None:
+            if title == "Resource/Iron":
+                raise EditFailed(f"{title}: protectedtitle")
+            super().save(title, *args, **kwargs)
+
+    monkeypatch.setattr(updaters, "updaters_to_run", ["resources"])
+    set_backend(RefusingBackend())
+    updaters.run_all()
+
+    assert updaters.failed_pages == {"Resource/Iron"}
+    assert updaters.edit_report["created"] == 52
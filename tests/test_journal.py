@@ -0,0 +1,60 @@
+import os
+from typing import Optional
+
+import pytest
+
+import updaters
+from updaters import LocalBackend, set_backend
+from updaters.journal import JOURNAL_DIR
+
+UPDATERS = ["asteroids", "equipment", "resources", "stations", "upgrades"]
+
+
+class CrashingBackend(LocalBackend):
+    """
+    A wiki whose session expires after a number of edits.
+    """
+    def __init__(self, edits: Optional[int]):
+        super().__init__()
+        self.edits = edits
+
+    def save(self, *args, **kwargs) -> None:
+        if self.edits is not None and self.calls["edit"] >= self.edits:
+            raise RuntimeError("session expired")
+        super().save(*args, **kwargs)
+
+
+def test_resume_skips_pages_finished_before_a_crash(monkeypatch):
+    monkeypatch.setattr(updaters, "updaters_to_run", UPDATERS)
+    backend = CrashingBackend(edits=50)
+    set_backend(backend)
+    with pytest.raises(RuntimeError):
+        updaters.run_all(workers=4)
+    assert os.path.isdir(JOURNAL_DIR)
+
+    backend.edits = None
+    backend.calls.clear()
+    updaters.run_all(workers=4, resume=True)
+
+    assert updaters.edit_report["resumed"] == 50
+    assert updaters.edit_report["created"] == 114 - 50
+    assert backend.calls["edit"] == 114 - 50
+    assert not os.path.exists(JOURNAL_DIR)
+
+    reference = LocalBackend()
+    set_backend(reference)
+    updaters.run_all()
+    assert backend.pages() == reference.pages()
+
+
+def test_journal_is_not_resumed_after_the_data_changed(monkeypatch):
+    monkeypatch.setattr(updaters, "updaters_to_run", ["resources"])
+    set_backend(CrashingBackend(edits=10))
+    with pytest.raises(RuntimeError):
+        updaters.run_all()
+
+    monkeypatch.setattr(updaters.journal, "data_hash", lambda: "changed")
+    set_backend(LocalBackend())
+    updaters.run_all(resume=True)
+    assert updaters.edit_report["resumed"] == 0
+    assert updaters.edit_report["created"] == 53
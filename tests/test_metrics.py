@@ -0,0 +1,22 @@
+import json
+
+import updaters
+from updaters import set_metrics_files
+
+
+def test_run_writes_metrics_files(monkeypatch):
+    monkeypatch.setattr(updaters, "updaters_to_run", ["resources"])
+    set_metrics_files("metrics/run.json", "metrics/run.prom")
+    updaters.run_all()
+
+    with open("metrics/run.json") as f:
+        summary = json.load(f)
+    resources = summary["updaters"]["resources"]
+    assert resources["total"]["created"] == 53
+    assert resources["stages"]["save"]["api_calls"] == 53
+    assert summary["updaters"]["database"]["total"]["refreshed"] > 0
+
+    with open("metrics/run.prom") as f:
+        text = f.read()
+    assert 'astronomics_updater_pages{updater="resources",stage="save",outcome="created"} 53' in text
+    assert 'astronomics_updater_seconds{updater="database"}' in text
@@ -0,0 +1,64 @@
+import threading
+from typing import Optional
+
+import pytest
+
+from updaters import scheduler
+from updaters.pipeline import stream
+
+
+@pytest.fixture(params=[1, 4], ids=["one worker", "four workers"])
+def workers(request) -> int:
+    scheduler.set_concurrency(request.param)
+    return request.param
+
+
+def produce_numbers(count: int, fail_at: Optional[int] = None):
+    def produce(put):
+        for number in range(count):
+            if number == fail_at:
+                raise ValueError("producer failed")
+            put(number)
+    return produce
+
+
+def test_items_arrive_in_order(workers):
+    consumed = []
+    stream(produce_numbers(100), consumed.append)
+    assert consumed == list(range(100))
+
+
+def test_producer_error_is_raised(workers):
+    consumed = []
+    with pytest.raises(ValueError, match="producer failed"):
+        stream(produce_numbers(100, fail_at=10), consumed.append)
+    assert consumed == list(range(10))
+
+
+def test_consumer_error_stops_the_producer(workers):
+    produced = []
+
+    def produce(put):
+        for number in range(1000):
+            produced.append(number)
+            put(number)
+
+    def consume(number):
+        if number == 5:
+            raise ValueError("consumer failed")
+
+    threads = threading.active_count()
+    with pytest.raises(ValueError, match="consumer failed"):
+        stream(produce, consume)
+    assert len(produced) < 1000
+    assert threading.active_count() == threads
+
+
+def test_error_in_a_nested_stream_is_raised(workers):
+    def render(put):
+        stream(produce_numbers(100, fail_at=50), lambda number: put(number * 2))
+
+    consumed = []
+    with pytest.raises(ValueError, match="producer failed"):
+        stream(render, consumed.append)
+    assert consumed == [number * 2 for number in range(50)]
@@ -0,0 +1,31 @@
+import os
+
+import updaters
+from updaters import LocalBackend, set_backend
+
+
+def rendered_files(directory: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(directory))
+
+
+def test_render_offline_writes_every_page_as_new(wiki):
+    updaters.render_all("rendered")
+
+    assert rendered_files("rendered") == 114
+    assert os.path.exists(os.path.join("rendered", "Asteroid", "CC1.wiki"))
+    assert not wiki.calls
+
+
+def test_render_updates_writes_changed_pages_without_editing(wiki):
+    updaters.load_updater("resources").run()
+    stale = {title: text.replace("1", "7") for title, text in wiki.pages().items()}
+    backend = LocalBackend()
+    backend.load_pages(stale)
+    set_backend(backend)
+
+    updaters.render_all("rendered", read_wiki=True)
+
+    assert updaters.edit_report["updated"] > 0
+    assert rendered_files("rendered") == 114 - 53 + updaters.edit_report["updated"]
+    assert backend.pages() == stale
+    assert "edit" not in backend.calls
@@ -1,33 +1,265 @@
-from .util import set_client
-from .asteroids import run as asteroid_updater, force_database_update as force_asteroid_update
-from .equipment import run as equipment_updater, force_database_update as force_equipment_update
-from .resources import run as resource_updater, force_database_update as force_resource_update
-from .stations import run as station_updater, force_database_update as force_station_update
-from .upgrades import run as upgrade_updater, force_database_update as force_upgrade_update
-
-# Run all update scripts in
+from time import perf_counter
+
+# Time the import of the package itself, see print_import_times
+package_import_start = perf_counter()
+
+import traceback
+from datetime import datetime
+from functools import partial
+from typing import List, Optional
+
+from . import dataset
+from .changes import detect_changes, save_changes
+from .dependencies import DependencyGraph
+from .profiling import PROFILE_MODES, profile_tasks
+from .budget import budgeted, load_remainder
+from .journal import journaled
+from .metrics import measure_updater, reset_metrics, set_metrics_files, write_metrics
+from .parsing import set_parse_processes
+from .pipeline import set_queue_depth
+from .backend import LocalBackend, WikiBackend
+from .registry import UPDATERS, import_seconds, load_updater, load_updaters, print_import_times
+from .util import (set_client, set_backend, set_output_dir, reset_report, reset_existence, print_report,
+                   bulk_database_update, edit_report, failed_pages)
+from .scheduler import run_concurrently, set_concurrency
+from .throttle import set_rate_limits
+from .watcher import make_watcher, wait_for_changes
+
+# Run all update scripts in, only these are imported by run_all
 updaters_to_run = [
     # Page data update scripts
-    #asteroid_updater,
-    #equipment_updater,
-    #resource_updater,
-    #station_updater,
-    #upgrade_updater,
-
-    # Database update checkers
-    force_asteroid_update,
-    force_equipment_update,
-    force_resource_update,
-    force_station_update,
-    force_upgrade_update,
+    #"asteroids",
+    #"equipment",
+    #"resources",
+    #"stations",
+    #"upgrades",
+]
+
+# Page data update scripts that can limit themselves to the pages whose data changed
+incremental_updaters = [
+    "asteroids",
+    "equipment",
+    "resources",
+    "stations",
+    "upgrades",
+]
+
+# Database update checkers, their pages are refreshed together in bulk
+database_titles_to_update = [
+    "asteroids",
+    "equipment",
+    "resources",
+    "stations",
+    "upgrades",
 ]
 
+# Names the updater functions were imported as before the updaters were loaded lazily
+updater_functions = {
+    "asteroid_updater": ("asteroids", "run"),
+    "equipment_updater": ("equipment", "run"),
+    "resource_updater": ("resources", "run"),
+    "station_updater": ("stations", "run"),
+    "upgrade_updater": ("upgrades", "run"),
+    "force_asteroid_update": ("asteroids", "force_database_update"),
+    "force_equipment_update": ("equipment", "force_database_update"),
+    "force_resource_update": ("resources", "force_database_update"),
+    "force_station_update": ("stations", "force_database_update"),
+    "force_upgrade_update": ("upgrades", "force_database_update"),
+    "asteroid_titles": ("asteroids", "database_titles"),
+    "equipment_titles": ("equipment", "database_titles"),
+    "resource_titles": ("resources", "database_titles"),
+    "station_titles": ("stations", "database_titles"),
+    "upgrade_titles": ("upgrades", "database_titles"),
+}
+
+
+def __getattr__(name: str):
+    # Load an updater on first use of one of its functions
+    if name in updater_functions:
+        module, function = updater_functions[name]
+        return getattr(load_updater(module), function)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-def run_all():
+def run_all(workers: Optional[int] = None, resume: bool = False, max_edits: Optional[int] = None,
+            deadline: Optional[datetime] = None):
     """
     Run all updaters that need to run.
     If updaters are unnecessary or outdated, change here wetter they run or not.
+
+    The updaters run side by side on a pool of workers, which also handles the page batches inside them.
+    All of them share the request and edit limits set with set_rate_limits.
+
+    Every finished page is written to a journal, which is kept when the run fails.
+    Resuming skips the pages the failed run finished, as long as the data files didn't change since.
+
+    With a maximum number of edits or a deadline the run stops once either is reached, see run_within_budget.
+    """
+    if workers is not None:
+        set_concurrency(workers)
+
+    reset_report()
+    reset_existence()
+    reset_metrics()
+    with journaled(resume):
+        if max_edits is not None or deadline is not None or load_remainder() is not None:
+            run_within_budget(max_edits, deadline)
+        else:
+            run_concurrently(updater.run for updater in load_updaters(updaters_to_run))
+            force_database_updates()
+    print_report()
+    write_metrics()
+
+
+def profile_all(mode: str = "cprofile", output_dir: str = "profiles", top: int = 20, updater: Optional[str] = None):
+    """
+    Run all updaters like run_all, but one at a time under a profiler, see profiling.profile_tasks.
+    The database updates are profiled as a task of their own.
+
+    :param mode: cprofile, tracemalloc or sample
+    :param updater: Only profile this updater, like "resources", whether it is set to run or not
+    """
+    if updater is not None:
+        tasks = {updater: load_updater(updater).run}
+    else:
+        tasks = {name: load_updater(name).run for name in updaters_to_run}
+        tasks["database"] = force_database_updates
+
+    reset_report()
+    reset_existence()
+    reset_metrics()
+    profile_tasks(tasks, mode, output_dir, top)
+    print_report()
+    write_metrics()
+
+
+def run_within_budget(max_edits: Optional[int] = None, deadline: Optional[datetime] = None):
+    """
+    Run all updaters, doing the most valuable work first until the edits or the time run out:
+    first the new pages of every updater, then the changed infobox values, then the database updates.
+    The pages left over are saved, and the next run continues with only those pages.
+    """
+    remainder = load_remainder()
+    if remainder is None:
+        pages = {name: None for name in updaters_to_run}
+        touches = None
+    else:
+        touches = remainder.pop("database", [])
+        pages = remainder
+        print(f"Continuing an earlier run, {sum(len(titles) for titles in pages.values()) + len(touches)} pages left")
+
+    with budgeted(max_edits, deadline) as budget:
+        # The updaters create their new pages and put their infobox updates aside
+        run_concurrently(partial(load_updater(name).run, only) for name, only in pages.items())
+        run_concurrently(partial(load_updater(name).run, updates) for name, updates in budget.start_updates().items())
+        budget.start_touches()
+        force_database_updates(touches)
+
+    left = sum(len(titles) for titles in budget.remainder.values())
+    if left:
+        print(f"{left} pages left for the next run")
+
+
+def force_database_updates(titles: Optional[List[str]] = None):
+    """
+    Collect the pages of all database update checkers and refresh them together,
+    so pages are purged in as few batches as possible.
+
+    :param titles: Only refresh these pages
+    """
+    with measure_updater("database"):
+        if titles is None:
+            titles = []
+            for updater in load_updaters(database_titles_to_update):
+                titles += updater.database_titles()
+        bulk_database_update(titles)
+
+
+def run_changed(workers: Optional[int] = None, resume: bool = False):
+    """
+    Only update the pages made from rows that were added, modified or removed since the last successful run.
+    The first run has nothing to compare with, so it updates every page.
+
+    Rows are followed to every page they are used on through the dependency graph, also across sheets,
+    so a changed recipe only updates its machine page and a changed contract only its station page.
+    Pages that fail to save are tried again by the next run.
+
+    :param resume: Skip the pages a failed earlier run already finished, see run_all
     """
-    for updater in updaters_to_run:
-        updater()
+    if workers is not None:
+        set_concurrency(workers)
+
+    changes = detect_changes()
+    print(changes.summary())
+
+    graph = DependencyGraph(load_updaters(incremental_updaters))
+    tasks = [partial(updater.run, pages) for updater, pages in graph.by_updater(changes.affected_pages(graph)).items()]
+
+    reset_report()
+    reset_existence()
+    reset_metrics()
+    with journaled(resume):
+        run_concurrently(tasks)
+    print_report()
+    write_metrics()
+    save_changes(changes, failed_pages)
+
+
+def watch(workers: Optional[int] = None, debounce: float = 2.0, poll_interval: float = 1.0):
+    """
+    Keep running, and update the pages made from the data files whenever they change.
+    Bursts of writes are handled as one change, and only the updaters with changed rows run.
+    The wiki client and its connection stay open between updates.
+
+    :param debounce: Seconds without new writes before the changes are handled
+    :param poll_interval: Seconds between checks of the data files, when inotify is not available
+    """
+    watcher = make_watcher(dataset.data_dir, poll_interval)
+    try:
+        # Catch up on changes made while not watching
+        sheets = list(dataset.SHEETS)
+        while True:
+            if sheets:
+                dataset.reload(sheets)
+                try:
+                    run_changed(workers, resume=True)
+                except Exception:
+                    # The changes are only saved after a successful run, so the next change retries them
+                    traceback.print_exc()
+
+            changed = wait_for_changes(watcher, debounce)
+            sheets = [sheet for sheet, file_name in dataset.SHEETS.items() if file_name in changed]
+            if sheets:
+                print("Changed data: " + ", ".join(sheets))
+    finally:
+        watcher.close()
+
+
+def render_all(output_dir: str = "rendered pages", read_wiki: bool = False):
+    """
+    Render every page and write them as files to the output directory, without editing the wiki.
+    Page titles map to paths, so Asteroid/CC1 is written to <output_dir>/Asteroid/CC1.wiki.
+    Offline every page is rendered as a new page, so what the modifiers would change on existing pages isn't shown.
+
+    :param read_wiki: Read the pages from the wiki set with set_client or set_backend, without editing it,
+                      and write the pages that exist as the modifiers would save them
+    """
+    set_output_dir(output_dir, read_wiki)
+    reset_report()
+    reset_metrics()
+    start = perf_counter()
+    try:
+        run_concurrently(updater.run for updater in load_updaters(incremental_updaters))
+    finally:
+        set_output_dir(None)
+    elapsed = perf_counter() - start
+
+    rendered = edit_report["created"] + edit_report["updated"]
+    rows = sum(len(rows) for rows in dataset.loaded_sheets.values())
+    rate = 1 / elapsed if elapsed else 0
+    write_metrics()
+    print(f"Rendered {rendered} pages from {rows} rows to {output_dir} in {elapsed:.3f}s "
+          f"({rows * rate:.0f} rows, {rendered * rate:.0f} pages per second)")
+
 
+import_seconds[__name__] = perf_counter() - package_import_start
@@ -1,14 +1,16 @@
-import csv
-from typing import List
+from typing import TYPE_CHECKING, Collection, Dict, List, Optional
 
-from .util import create_page, page_exists, run_template_modifier, database_update
-from mwcleric import TemplateModifierBase
-from mwparserfromhell.nodes import Template
+from . import dataset
+from .dependencies import Source
+from .context import RunContext
+from .metrics import measure_updater, stage
+from .dataset import Row
+from .util import InfoboxModifier, create_or_mark_pages, bulk_database_update, render_groups, select_pages
 
-prefix = "Asteroid/"
+if TYPE_CHECKING:
+    from mwparserfromhell.nodes import Template
 
-pages_to_update = []
-data_to_update = {}
+prefix = "Asteroid/"
 
 
 def full_page(sub_page: str) -> str:
@@ -21,7 +23,7 @@ def parse_resources(field: str) -> List[str]:
     return sorted([r for r in field.split(", ")], key=str.casefold)
 
 
-def make_asteroid_page(page: str, data: dict) -> None:
+def render_asteroid_page(data: dict) -> str:
     # Table headers:
     # Internal id
     # In-Game ID
@@ -33,7 +35,7 @@ def make_asteroid_page(page: str, data: dict) -> None:
     # Underground deposit (Rare)
     # Liquids
     # Gasses
-    create_page(page, f"""{{{{Beta content}}}}
+    return f"""{{{{Beta content}}}}
 {{{{Asteroid Infobox
 |Name={data["In-Game ID"]}
 |Region={data["Region"]}
@@ -48,16 +50,18 @@ def make_asteroid_page(page: str, data: dict) -> None:
 }}}}
 
 {{{{Main site nav}}}}
-""")
+"""
+
 
+renderers = {"asteroid": render_asteroid_page}
 
-class AsteroidModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
 
-        super().__init__(site, template, **data)
+def render_pages(asteroid_data: Dict[str, Row]) -> Dict[str, str]:
+    return render_groups({"asteroid": asteroid_data}, renderers)
 
-    def update_template(self, template: Template):
+
+class AsteroidModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -65,51 +69,53 @@ class AsteroidModifier(TemplateModifierBase):
 
         print("Updating Asteroid Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["In-Game ID"])
-        template.add("Region", info["Region"])
-        template.add("Composition", info["Composition"])
-        template.add("Pirates", info["Pirate warning"])
-        template.add("Surface Resources", ",".join(parse_resources(info["Surface resource"])))
-        template.add("Deposit Resources", ",".join(sorted(parse_resources(info["Underground deposit (Common)"])
-                                                          + parse_resources(info["Underground deposit (Rare)"]),
-                                                          key=str.casefold)))
-        template.add("Liquid Resources", ",".join(parse_resources(info["Liquids"])))
-        template.add("Gas Resources", ",".join(parse_resources(info["Gasses"])))
-
-
-def run():
-    with open("data files/Asteroid resources.csv") as f:
-        asteroid_data = {}
-        for row in csv.DictReader(f):
-            if row["In-Game ID"] == "" or row["Internal id"] == "" or row["Composition"] == "Station":
-                continue
-            page = full_page(row["In-Game ID"])
-            asteroid_data[page] = row
-
-    for page, data in asteroid_data.items():
-        if page_exists(page):
-            pages_to_update.append(page)
-            data_to_update[page] = data
-        else:
-            make_asteroid_page(page, data)
-
-    if len(pages_to_update) > 0:
-        run_template_modifier(
-            AsteroidModifier,
-            "Asteroid Infobox",
-            pages_to_update,
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
+        self.set_param(template, "Name", info["In-Game ID"])
+        self.set_param(template, "Region", info["Region"])
+        self.set_param(template, "Composition", info["Composition"])
+        self.set_param(template, "Pirates", info["Pirate warning"])
+        self.set_param(template, "Surface Resources", ",".join(parse_resources(info["Surface resource"])))
+        deposits = sorted(parse_resources(info["Underground deposit (Common)"])
+                          + parse_resources(info["Underground deposit (Rare)"]),
+                          key=str.casefold)
+        self.set_param(template, "Deposit Resources", ",".join(deposits))
+        self.set_param(template, "Liquid Resources", ",".join(parse_resources(info["Liquids"])))
+        self.set_param(template, "Gas Resources", ",".join(parse_resources(info["Gasses"])))
+
+
+def collect_pages() -> Dict[str, Row]:
+    return {full_page(row["In-Game ID"]): row for row in dataset.asteroids()}
+
+
+def page_sources(data: Row) -> List[Source]:
+    return [("asteroids", data["In-Game ID"])]
+
+
+def page_dependencies() -> Dict[str, List[Source]]:
+    return {page: page_sources(data) for page, data in collect_pages().items()}
+
+
+def run(only: Optional[Collection[str]] = None):
+    with measure_updater("asteroids"), stage("render"):
+        asteroid_data = select_pages(collect_pages(), only)
+
+        with RunContext(["asteroid"]) as context:
+            update_pages(context, asteroid_data)
+
+
+templates = {"asteroid": "Asteroid Infobox"}
+modifiers = {"asteroid": AsteroidModifier}
+
+
+def update_pages(context: RunContext, asteroid_data: Dict[str, Row]):
+    create_or_mark_pages(context, {"asteroid": asteroid_data}, renderers, templates, modifiers)
+
+
+def database_titles() -> List[str]:
+    return list(collect_pages().keys())
 
 
 def force_database_update():
-    with open("data files/Asteroid resources.csv") as f:
-        for row in csv.DictReader(f):
-            # Filter empty rows
-            if row["In-Game ID"] != "" and row["Composition"] != "Station":
-                database_update(full_page(row["In-Game ID"]))
+    bulk_database_update(database_titles())
 
 
-__all__ = ["run", "force_database_update"]
+__all__ = ["run", "collect_pages", "render_pages", "page_dependencies", "database_titles", "force_database_update"]
@@ -0,0 +1,271 @@
+import asyncio
+import json
+from threading import Thread
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar, Union
+from urllib.parse import urlencode
+
+from .backend import (TRANSIENT_API_ERRORS, EditFailed, Page, WikiBackend, existence, purge_statuses, retry_after,
+                      revision_pages)
+from .metrics import record_call
+from .throttle import TransientError
+
+# aiohttp is only needed for this backend, the package works without it
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+T = TypeVar("T")
+
+# API endpoint of the wiki the updaters edit
+API_URL = "https://astronomics.wiki.gg/api.php"
+
+# Read queries in flight at the same time, the writes get one more connection of their own
+MAX_READS = 8
+
+# Seconds the database may lag behind before the wiki refuses a call, see TRANSIENT_API_ERRORS
+MAX_LAG = 5
+
+# Seconds a single API call may take
+REQUEST_TIMEOUT = 60
+
+USER_AGENT = "astronomics-wiki-updater (https://github.com/alikimoko/astronomics-wiki-updater)"
+
+
+class WikiAPIError(Exception):
+    """
+    The wiki refused a call for a reason that won't go away by trying again.
+    """
+    def __init__(self, code: str, info: str):
+        super().__init__(f"{code}: {info}")
+        self.code = code
+        self.info = info
+
+
+class AsyncBackend(WikiBackend):
+    """
+    A live wiki, through the API on an asyncio event loop with a pool of keep-alive connections.
+
+    The event loop runs on a thread of its own, so the updaters and their worker threads call this backend
+    like any other. Reads from all threads are in flight at the same time, up to max_reads,
+    while edits are sent one at a time, in the order they were made.
+    Callers wait on the edit rate limit before an edit is queued, see throttle.throttled_edit.
+    The _all methods send all their batches at once, so a single caller can have max_reads reads in flight.
+    """
+    def __init__(self, api_url: str = API_URL, username: Optional[str] = None, password: Optional[str] = None,
+                 max_reads: int = MAX_READS):
+        if aiohttp is None:
+            raise ImportError("AsyncBackend needs aiohttp, install it with pip install aiohttp")
+        self.api_url = api_url
+        self.max_reads = max_reads
+        self.read_batches = max_reads
+        self.csrf_token = "+\\"
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        try:
+            self.run(self.start(username, password))
+        except BaseException:
+            # Nothing would close the connections and stop the event loop of a backend that failed to start
+            self.close()
+            raise
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def start(self, username: Optional[str], password: Optional[str]) -> None:
+        # Made on the event loop, the session and the queue belong to it
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_reads + 1, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            headers={"User-Agent": USER_AGENT},
+        )
+        self.reads = asyncio.Semaphore(self.max_reads)
+        self.writes: asyncio.Queue = asyncio.Queue()
+        self.writer = asyncio.ensure_future(self.write_queue())
+        if username is not None:
+            await self.login(username, password)
+
+    def close(self) -> None:
+        """
+        Wait for the queued edits, then close the connections and stop the event loop.
+        """
+        self.run(self.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    async def stop(self) -> None:
+        await self.writes.join()
+        self.writer.cancel()
+        await self.session.close()
+
+    async def call(self, params: Dict[str, Any], post: bool = False) -> Tuple[dict, int, int]:
+        """
+        Make an API call.
+
+        :return: The result, and the bytes sent and received
+        """
+        params = {**params, "format": "json", "maxlag": MAX_LAG}
+        body = urlencode(params)
+        try:
+            if post:
+                request = self.session.post(self.api_url, data=body,
+                                            headers={"Content-Type": "application/x-www-form-urlencoded"})
+            else:
+                request = self.session.get(self.api_url, params=params)
+            async with request as response:
+                content = await response.read()
+                if response.status == 429 or response.status >= 500:
+                    raise TransientError(f"HTTP {response.status} {response.reason}", retry_after(response.headers))
+                response.raise_for_status()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            raise TransientError(str(e) or type(e).__name__) from e
+
+        result = json.loads(content)
+        if "error" in result:
+            code, info = result["error"].get("code", ""), result["error"].get("info", "")
+            if code in TRANSIENT_API_ERRORS:
+                raise TransientError(f"{code}: {info}", result["error"].get("lag"))
+            raise WikiAPIError(code, info)
+        return result, len(body), len(content)
+
+    async def read(self, params: Dict[str, Any]) -> Tuple[dict, int, int]:
+        async with self.reads:
+            return await self.call(params)
+
+    async def read_all(self, calls: List[Dict[str, Any]], return_exceptions: bool = False) -> list:
+        return await asyncio.gather(*(self.read(params) for params in calls), return_exceptions=return_exceptions)
+
+    async def write(self, params: Dict[str, Any]) -> Tuple[dict, int, int]:
+        done = self.loop.create_future()
+        await self.writes.put((params, done))
+        return await done
+
+    async def write_queue(self) -> None:
+        # The only task that edits, so the edits reach the wiki one at a time and in order
+        while True:
+            params, done = await self.writes.get()
+            try:
+                done.set_result(await self.edit(params))
+            except Exception as e:
+                done.set_exception(e)
+            finally:
+                self.writes.task_done()
+
+    async def edit(self, params: Dict[str, Any]) -> Tuple[dict, int, int]:
+        try:
+            return await self.call({**params, "token": self.csrf_token}, post=True)
+        except WikiAPIError as e:
+            # The token of a long run can expire, get a new one
+            if e.code != "badtoken":
+                raise
+            self.csrf_token = await self.token("csrf")
+            return await self.call({**params, "token": self.csrf_token}, post=True)
+
+    async def token(self, kind: str) -> str:
+        result, _, _ = await self.call({"action": "query", "meta": "tokens", "type": kind})
+        return result["query"]["tokens"][kind + "token"]
+
+    async def login(self, username: str, password: str) -> None:
+        result, _, _ = await self.call({
+            "action": "login", "lgname": username, "lgpassword": password, "lgtoken": await self.token("login"),
+        }, post=True)
+        if result["login"]["result"] != "Success":
+            raise WikiAPIError("login", result["login"].get("reason", result["login"]["result"]))
+        self.csrf_token = await self.token("csrf")
+
+    def request(self, call: Awaitable[Tuple[dict, int, int]]) -> dict:
+        # Counted on the calling thread, which knows the updater and stage the call is made for
+        result, bytes_sent, bytes_received = self.run(call)
+        record_call(bytes_sent, bytes_received)
+        return result
+
+    def request_all(self, calls: List[Dict[str, Any]]) -> List[Union[dict, TransientError]]:
+        """
+        Make several read calls at the same time.
+
+        :return: Per call its result, or the transient error it failed with
+        """
+        results = []
+        for result in self.run(self.read_all(calls, return_exceptions=True)):
+            if isinstance(result, TransientError):
+                results.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                result, bytes_sent, bytes_received = result
+                record_call(bytes_sent, bytes_received)
+                results.append(result)
+        return results
+
+    def pages_exist(self, titles: List[str]) -> Dict[str, bool]:
+        return existence(self.request(self.read({"action": "query", "titles": "|".join(titles)}))["query"])
+
+    def fetch(self, title: str) -> Page:
+        return self.fetch_many([title])[title]
+
+    def fetch_many(self, titles: List[str]) -> Dict[str, Page]:
+        return self.revisions(titles, self.request(self.read(revision_query(titles))))
+
+    def pages_exist_all(self, batches: List[List[str]]) -> List[Union[Dict[str, bool], TransientError]]:
+        results = self.request_all([{"action": "query", "titles": "|".join(batch)} for batch in batches])
+        return [result if isinstance(result, TransientError) else existence(result["query"]) for result in results]
+
+    def fetch_all(self, batches: List[List[str]]) -> List[Union[Dict[str, Page], TransientError]]:
+        results = self.request_all([revision_query(batch) for batch in batches])
+        return [result if isinstance(result, TransientError) else self.revisions(batch, result)
+                for batch, result in zip(batches, results)]
+
+    def revisions(self, titles: List[str], result: dict) -> Dict[str, Page]:
+        pages = revision_pages(result["query"])
+
+        # Pages over the size limit of a single response are fetched on their own, all at the same time
+        missing = [title for title in titles if title not in pages]
+        results = self.run(self.read_all([revision_query([title]) for title in missing])) if missing else []
+        for title, (result, bytes_sent, bytes_received) in zip(missing, results):
+            record_call(bytes_sent, bytes_received)
+            pages[title] = revision_pages(result["query"]).get(title, Page(title, ""))
+        return pages
+
+    def save(self, title: str, text: str, summary: str, base_revision: Optional[int] = None) -> None:
+        params = {"action": "edit", "title": title, "text": text, "summary": summary, "bot": 1}
+        if base_revision is not None:
+            params["baserevid"] = base_revision
+        try:
+            result = self.request(self.write(params))
+        except WikiAPIError as e:
+            if e.code != "editconflict":
+                raise
+            raise EditFailed(f"{title}: {e}") from e
+        except aiohttp.ClientResponseError as e:
+            # Other HTTP errors than rate limits and server errors refuse this edit only, like mwclient's EditError
+            raise EditFailed(f"{title}: HTTP {e.status} {e.message}") from e
+        if result["edit"].get("result") != "Success":
+            raise EditFailed(f"{title}: {result['edit']}")
+
+    def touch(self, title: str) -> None:
+        try:
+            self.request(self.write({"action": "edit", "title": title, "appendtext": "", "nocreate": 1}))
+        except WikiAPIError as e:
+            # Like mwclient, touching a page that doesn't exist does nothing
+            if e.code != "missingtitle":
+                raise
+        except aiohttp.ClientResponseError as e:
+            raise EditFailed(f"{title}: HTTP {e.status} {e.message}") from e
+
+    def purge(self, titles: List[str]) -> Dict[str, str]:
+        try:
+            result = self.request(self.write({"action": "purge", "titles": "|".join(titles), "forcelinkupdate": 1}))
+        except (WikiAPIError, aiohttp.ClientError) as e:
+            return {title: str(e) for title in titles}
+        return purge_statuses(result)
+
+
+def revision_query(titles: List[str]) -> Dict[str, Any]:
+    return {
+        "action": "query", "prop": "revisions", "rvprop": "ids|content", "rvslots": "main", "titles": "|".join(titles),
+    }
+
+
+__all__ = ["AsyncBackend", "WikiAPIError"]
@@ -0,0 +1,393 @@
+import re
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from threading import Lock
+from time import sleep
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Mapping, Optional, TypeVar, Union
+
+from .metrics import record_call
+from .throttle import TransientError
+
+T = TypeVar("T")
+
+# The wiki client takes long to import, its modules are imported by the methods of MwclericBackend,
+# which only run once a client has been made
+if TYPE_CHECKING:
+    from mwcleric import WikiggClient
+    from requests import Response
+
+# Status a purged page can have besides a failure reason
+REFRESHED = "refreshed"
+MISSING = "missing"
+
+# Namespaces a local page can be in, anything else is in the main namespace
+LOCAL_NAMESPACES = {
+    "Talk": 1,
+    "User": 2,
+    "Project": 4,
+    "File": 6,
+    "MediaWiki": 8,
+    "Template": 10,
+    "Help": 12,
+    "Category": 14,
+    "Module": 828,
+}
+
+# API error codes of calls that will likely succeed when tried again later
+TRANSIENT_API_ERRORS = {
+    "maxlag",
+    "ratelimited",
+    "readonly",
+    "internal_api_error_DBConnectionError",
+    "internal_api_error_DBQueryError",
+}
+
+
+class EditFailed(Exception):
+    """
+    The wiki refused the edit of a single page, like when someone else edited it since it was read.
+    Trying again won't help, the page has to be read again first.
+    """
+
+
+class Page:
+    """
+    The text of a page, with the attributes the modifiers use from mwclient pages.
+    The revision is the id of the revision the text comes from, if the backend knows it.
+    """
+    def __init__(self, name: str, text: str, namespace: int = 0, page_title: str = None,
+                 revision: Optional[int] = None):
+        self.name = name
+        self.text = text
+        self.namespace = namespace
+        self.page_title = page_title if page_title is not None else name
+        self.revision = revision
+
+
+class WikiBackend:
+    """
+    All reads and writes the updaters do on a wiki.
+    Methods taking a list of titles get at most one batch of titles at a time,
+    the methods ending in _all take several batches and read them at once.
+    """
+    # Batches a caller should hand to the _all methods at once, more than one if reads can be in flight together
+    read_batches = 1
+
+    def pages_exist(self, titles: List[str]) -> Dict[str, bool]:
+        raise NotImplementedError()
+
+    def fetch(self, title: str) -> Page:
+        raise NotImplementedError()
+
+    def fetch_many(self, titles: List[str]) -> Dict[str, Page]:
+        """
+        Fetch the current text of several pages at once, pages that don't exist get an empty text.
+        Backends that can't do this in one request fetch the pages one by one.
+        """
+        return {title: self.fetch(title) for title in titles}
+
+    def pages_exist_all(self, batches: List[List[str]]) -> List[Union[Dict[str, bool], TransientError]]:
+        """
+        Look up several batches of titles like pages_exist.
+
+        :return: Per batch its result, or the transient error it failed with
+        """
+        return [attempt(self.pages_exist, batch) for batch in batches]
+
+    def fetch_all(self, batches: List[List[str]]) -> List[Union[Dict[str, Page], TransientError]]:
+        """
+        Fetch several batches of pages like fetch_many.
+
+        :return: Per batch its result, or the transient error it failed with
+        """
+        return [attempt(self.fetch_many, batch) for batch in batches]
+
+    def save(self, title: str, text: str, summary: str, base_revision: Optional[int] = None) -> None:
+        """
+        Save the text of a page.
+        With the revision the page was read at, the save fails with an EditFailed if the page was edited since.
+        """
+        raise NotImplementedError()
+
+    def touch(self, title: str) -> None:
+        raise NotImplementedError()
+
+    def purge(self, titles: List[str]) -> Dict[str, str]:
+        """
+        Purge pages with a forced links update.
+
+        :return: Per page REFRESHED, MISSING or the reason it failed
+        """
+        raise NotImplementedError()
+
+
+class MwclericBackend(WikiBackend):
+    """
+    A live wiki, through an mwcleric client.
+    Errors that will likely go away when the call is tried again later are raised as a TransientError.
+    """
+    def __init__(self, client: "WikiggClient"):
+        self.client = client
+        # Every HTTP request counts as an API call, retries included
+        hooks = client.client.connection.hooks["response"]
+        if record_response not in hooks:
+            hooks.append(record_response)
+
+    def pages_exist(self, titles: List[str]) -> Dict[str, bool]:
+        with transient_errors():
+            result = self.client.client.api("query", titles="|".join(titles))["query"]
+
+        return existence(result)
+
+    def fetch(self, title: str) -> Page:
+        with transient_errors():
+            page = self.client.client.pages[title]
+            return Page(page.name, page.text(), page.namespace, page.page_title)
+
+    def fetch_many(self, titles: List[str]) -> Dict[str, Page]:
+        with transient_errors():
+            result = self.client.client.api("query", prop="revisions", rvprop="ids|content", rvslots="main",
+                                            titles="|".join(titles))["query"]
+
+        pages = revision_pages(result)
+        for title in titles:
+            if title not in pages:
+                pages[title] = self.fetch(title)
+        return pages
+
+    def save(self, title: str, text: str, summary: str, base_revision: Optional[int] = None) -> None:
+        from mwclient.errors import EditError
+
+        # save_title loads the page again, only the base revision tells the wiki which revision the text is based on
+        base = {"baserevid": base_revision} if base_revision is not None else {}
+        try:
+            with transient_errors():
+                self.client.save_title(title, text, summary=summary, **base)
+        except EditError as e:
+            raise EditFailed(f"{title}: {e}") from e
+
+    def touch(self, title: str) -> None:
+        with transient_errors():
+            self.client.touch_title(title)
+
+    def purge(self, titles: List[str]) -> Dict[str, str]:
+        from mwclient.errors import APIError
+        from requests import RequestException
+
+        try:
+            with transient_errors():
+                result = self.client.client.post("purge", titles="|".join(titles), forcelinkupdate=1)
+        except (APIError, RequestException) as e:
+            return {title: str(e) for title in titles}
+        return purge_statuses(result)
+
+
+class LocalBackend(WikiBackend):
+    """
+    A stand-in wiki that keeps its pages in SQLite, in memory unless a database file is given.
+    Every call is counted, and can be slowed down to simulate network latency.
+    """
+    def __init__(self, path: str = ":memory:", latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "title TEXT PRIMARY KEY, text TEXT NOT NULL, revision INTEGER NOT NULL, links_updated INTEGER NOT NULL)"
+        )
+
+    def request(self, kind: str, bytes_sent: int = 0, bytes_received: int = 0) -> None:
+        with self.lock:
+            self.calls[kind] += 1
+        record_call(bytes_sent, bytes_received)
+        if self.latency:
+            sleep(self.latency)
+
+    def load_pages(self, pages: Dict[str, str]) -> None:
+        """
+        Fill the wiki with existing pages, without counting calls.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, 1, 0)", pages.items()
+            )
+
+    def pages(self) -> Dict[str, str]:
+        with self.lock:
+            return dict(self.connection.execute("SELECT title, text FROM pages"))
+
+    def existing(self, titles: List[str]) -> Dict[str, bool]:
+        with self.lock:
+            found = {row[0] for row in self.connection.execute(
+                f"SELECT title FROM pages WHERE title IN ({','.join('?' * len(titles))})", titles
+            )}
+        return {title: title in found for title in titles}
+
+    def pages_exist(self, titles: List[str]) -> Dict[str, bool]:
+        self.request("query")
+        return self.existing(titles)
+
+    def fetch(self, title: str) -> Page:
+        return self.fetch_many([title])[title]
+
+    def fetch_many(self, titles: List[str]) -> Dict[str, Page]:
+        pages = self.stored_pages(titles)
+        self.request("fetch", bytes_received=sum(len(page.text.encode()) for page in pages.values()))
+        return pages
+
+    def stored_pages(self, titles: List[str]) -> Dict[str, Page]:
+        with self.lock:
+            rows = {row[0]: row[1:] for row in self.connection.execute(
+                f"SELECT title, text, revision FROM pages WHERE title IN ({','.join('?' * len(titles))})", titles
+            )}
+        pages = {}
+        for title in titles:
+            text, revision = rows.get(title, ("", None))
+            namespace = title.split(":")[0] if ":" in title else ""
+            pages[title] = Page(title, text, LOCAL_NAMESPACES.get(namespace, 0), revision=revision)
+        return pages
+
+    def save(self, title: str, text: str, summary: str, base_revision: Optional[int] = None) -> None:
+        self.request("edit", len(text.encode()) + len(summary.encode()))
+        with self.lock, self.connection:
+            if base_revision is not None:
+                current = self.connection.execute("SELECT revision FROM pages WHERE title = ?", (title,)).fetchone()
+                if current is None or current[0] != base_revision:
+                    raise EditFailed(f"{title}: editconflict")
+            self.connection.execute(
+                "INSERT INTO pages VALUES (?, ?, 1, 1) "
+                "ON CONFLICT(title) DO UPDATE SET text = excluded.text, revision = revision + 1, "
+                "links_updated = links_updated + 1",
+                (title, text)
+            )
+
+    def touch(self, title: str) -> None:
+        self.request("edit")
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE pages SET links_updated = links_updated + 1 WHERE title = ?", (title,))
+
+    def purge(self, titles: List[str]) -> Dict[str, str]:
+        self.request("purge")
+        exists = self.existing(titles)
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "UPDATE pages SET links_updated = links_updated + 1 WHERE title = ?",
+                [(title,) for title in titles if exists[title]]
+            )
+        return {title: REFRESHED if exists[title] else MISSING for title in titles}
+
+
+def attempt(call: Callable[..., T], *args) -> Union[T, TransientError]:
+    try:
+        return call(*args)
+    except TransientError as e:
+        return e
+
+
+@contextmanager
+def transient_errors() -> Iterator[None]:
+    """
+    Raise the errors of a live wiki call that will likely succeed when tried again later as a TransientError.
+    """
+    from mwclient.errors import APIError, MaximumRetriesExceeded
+    from mwcleric.errors import RetriedLoginAndStillFailed
+    from requests import ConnectionError, HTTPError, Timeout
+
+    try:
+        yield
+    except APIError as e:
+        if e.code not in TRANSIENT_API_ERRORS:
+            raise
+        # A maxlag error tells how far the database lags behind, like "Waiting for db1: 5 seconds lagged"
+        lag = re.search(r"([\d.]+) seconds? lagged", str(e.info))
+        raise TransientError(f"{e.code}: {e.info}", float(lag.group(1)) if lag else None) from e
+    except RetriedLoginAndStillFailed as e:
+        # mwcleric retries failed edits itself and only keeps the error codes of its attempts
+        if not e.codes or not all(code in TRANSIENT_API_ERRORS for code in e.codes):
+            raise
+        raise TransientError(str(e)) from e
+    except MaximumRetriesExceeded as e:
+        # mwclient gives up on a lagging database at once, mwcleric makes its clients without retries
+        raise TransientError("database lag") from e
+    except (ConnectionError, Timeout) as e:
+        raise TransientError(str(e)) from e
+    except HTTPError as e:
+        if e.response is None or (e.response.status_code != 429 and e.response.status_code < 500):
+            raise
+        raise TransientError(str(e), retry_after(e.response.headers)) from e
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    # Retry-After can also be a date, only the number of seconds is used
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def record_response(response: "Response", *args, **kwargs) -> None:
+    body = response.request.body or b""
+    record_call(len(response.request.url) + len(body.encode() if isinstance(body, str) else body),
+                len(response.content))
+
+
+def normalized_titles(result: dict) -> Dict[str, List[str]]:
+    # Normalized title -> the titles it was requested as
+    requested = {}
+    for normalized in result.get("normalized", []):
+        requested.setdefault(normalized["to"], []).append(normalized["from"])
+    return requested
+
+
+def existence(result: dict) -> Dict[str, bool]:
+    # The API reports normalized titles (first letter capitalised, underscores to spaces)
+    requested = normalized_titles(result)
+    exists = {}
+    for info in result["pages"].values():
+        for title in requested.get(info["title"], [info["title"]]):
+            exists[title] = "missing" not in info and "invalid" not in info
+    return exists
+
+
+def revision_pages(result: dict) -> Dict[str, Page]:
+    """
+    The pages of a query for the content of their latest revision.
+    Pages over the size limit of a single response are left out, the caller fetches those on their own.
+    """
+    requested = normalized_titles(result)
+    pages = {}
+    for info in result["pages"].values():
+        if "missing" not in info and "invalid" not in info and "revisions" not in info:
+            continue
+        revision = info["revisions"][0] if "revisions" in info else {}
+        namespace = info.get("ns", 0)
+        for title in requested.get(info["title"], [info["title"]]):
+            pages[title] = Page(
+                info["title"],
+                revision.get("slots", {}).get("main", {}).get("*", ""),
+                namespace,
+                info["title"].split(":", 1)[1] if namespace != 0 else info["title"],
+                revision.get("revid")
+            )
+    return pages
+
+
+def purge_statuses(result: dict) -> Dict[str, str]:
+    requested = normalized_titles(result)
+    statuses = {}
+    for info in result["purge"]:
+        for title in requested.get(info["title"], [info["title"]]):
+            if "missing" in info:
+                statuses[title] = MISSING
+            elif "invalid" in info:
+                statuses[title] = info.get("invalidreason", "invalid title")
+            elif "purged" not in info or "linkupdate" not in info:
+                statuses[title] = "not refreshed"
+            else:
+                statuses[title] = REFRESHED
+    return statuses
+
+
+__all__ = ["EditFailed", "Page", "WikiBackend", "MwclericBackend", "LocalBackend", "REFRESHED", "MISSING"]
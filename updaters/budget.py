@@ -0,0 +1,159 @@
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .changes import STATE_DIR
+from .metrics import current_updater
+
+REMAINDER_FILE = os.path.join(STATE_DIR, "remainder.json")
+
+# Kinds of work, in the order a run with a budget does them
+CREATE = "create"
+UPDATE = "update"
+TOUCH = "touch"
+
+
+class Budget:
+    """
+    The edits and time a run may spend, and the work left when they run out.
+    Pages left over are kept per updater, the database updates under "database".
+    """
+    def __init__(self, max_edits: Optional[int] = None, deadline: Optional[datetime] = None):
+        self.max_edits = max_edits
+        self.deadline = deadline
+        self.edits = 0
+        self.phase = CREATE
+        self.spent = False
+        self.lock = Lock()
+        # Updater -> pages whose infobox update waits for the update phase
+        self.updates: Dict[str, List[str]] = {}
+        # Updater -> pages left for the next run
+        self.remainder: Dict[str, List[str]] = {}
+
+    def exhausted(self) -> bool:
+        with self.lock:
+            if not self.spent and ((self.max_edits is not None and self.edits >= self.max_edits)
+                                   or (self.deadline is not None and datetime.now() >= self.deadline)):
+                self.spent = True
+                print(f"Budget spent after {self.edits} edits, leaving the remaining pages for the next run")
+            return self.spent
+
+    def spend(self) -> bool:
+        if self.exhausted():
+            return False
+        with self.lock:
+            # Another thread can have taken the last edit in the meantime
+            if self.max_edits is not None and self.edits >= self.max_edits:
+                return False
+            self.edits += 1
+        return True
+
+    def leave(self, updater: str, pages: Iterable[str]) -> None:
+        with self.lock:
+            self.remainder.setdefault(updater, []).extend(pages)
+
+    def defer(self, updater: str, pages: Iterable[str]) -> None:
+        with self.lock:
+            self.updates.setdefault(updater, []).extend(pages)
+
+    def start_updates(self) -> Dict[str, List[str]]:
+        """
+        Move on to the infobox updates, and get the pages to update per updater.
+        Without any budget left they all go to the remainder at once, without fetching them first.
+        """
+        self.phase = UPDATE
+        updates, self.updates = self.updates, {}
+        if self.exhausted():
+            for updater, pages in updates.items():
+                self.leave(updater, pages)
+            return {}
+        return updates
+
+    def start_touches(self) -> None:
+        self.phase = TOUCH
+
+
+# Budget of the current run, if it has one
+budget: Optional[Budget] = None
+
+
+def load_remainder() -> Optional[Dict[str, List[str]]]:
+    try:
+        with open(REMAINDER_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_remainder(remainder: Dict[str, List[str]]) -> None:
+    remainder = {updater: pages for updater, pages in remainder.items() if pages}
+    if not remainder:
+        if os.path.exists(REMAINDER_FILE):
+            os.remove(REMAINDER_FILE)
+        return
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(REMAINDER_FILE + ".tmp", "w") as f:
+        json.dump(remainder, f)
+    os.replace(REMAINDER_FILE + ".tmp", REMAINDER_FILE)
+
+
+@contextmanager
+def budgeted(max_edits: Optional[int] = None, deadline: Optional[datetime] = None) -> Iterator[Budget]:
+    """
+    Limit the edits and time of the run in this block, and save the pages left over for the next run.
+    A failing run keeps the remainder of the run before it.
+    """
+    global budget
+    budget = Budget(max_edits, deadline)
+    try:
+        yield budget
+        save_remainder({updater: list(dict.fromkeys(pages)) for updater, pages in budget.remainder.items()})
+    finally:
+        budget = None
+
+
+def defer_updates(pages: Iterable[str]) -> bool:
+    """
+    Put infobox updates aside while a run with a budget creates the new pages of every updater first.
+
+    :return: Whether the pages were put aside
+    """
+    if budget is None or budget.phase != CREATE:
+        return False
+    budget.defer(current_updater.get(), pages)
+    return True
+
+
+def out_of_budget(pages: List[str]) -> bool:
+    """
+    Whether the budget is spent, leaving the pages for the next run if so.
+    """
+    if budget is None or not budget.exhausted():
+        return False
+    budget.leave(current_updater.get(), pages)
+    return True
+
+
+def retry_later(pages: List[str]) -> None:
+    """
+    Leave pages that failed for the next run, if the run has a budget.
+    """
+    if budget is not None:
+        budget.leave(current_updater.get(), pages)
+
+
+def spend_edit(pages: List[str]) -> bool:
+    """
+    Take one edit from the budget for these pages, or leave them for the next run if it's spent.
+    """
+    if budget is None or budget.spend():
+        return True
+    budget.leave(current_updater.get(), pages)
+    return False
+
+
+__all__ = ["Budget", "CREATE", "UPDATE", "TOUCH", "load_remainder", "budgeted", "defer_updates", "out_of_budget",
+           "retry_later", "spend_edit"]
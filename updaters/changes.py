@@ -0,0 +1,105 @@
+import json
+import os
+from hashlib import sha256
+from typing import Dict, Iterable, List, Set
+
+from . import dataset
+from .dataset import Row
+from .dependencies import DependencyGraph, Source
+
+STATE_DIR = ".update_state"
+FINGERPRINT_FILE = os.path.join(STATE_DIR, "fingerprints.json")
+
+# Sheet name -> column that identifies a row
+NATURAL_KEYS = {
+    "asteroids": "In-Game ID",
+    "contracts": "Internal ID",
+    "equipment": "Name",
+    "recipes": "Identifier",
+    "resources": "Name",
+    "stations": "Name",
+    "upgrades": "Name",
+}
+
+
+class Changes:
+    """
+    The rows that were added, modified or removed since the last successful run.
+    """
+    def __init__(self, current: Dict[str, Dict[str, str]], previous: Dict[str, Dict[str, str]],
+                 previous_pages: Dict[str, List[Source]]):
+        self.current = current
+        self.previous_pages = previous_pages
+        self.added: Set[Source] = set()
+        self.modified: Set[Source] = set()
+        self.removed: Set[Source] = set()
+
+        for sheet, rows in current.items():
+            old_rows = previous.get(sheet, {})
+            for key, fingerprint in rows.items():
+                if key not in old_rows:
+                    self.added.add((sheet, key))
+                elif old_rows[key] != fingerprint:
+                    self.modified.add((sheet, key))
+            self.removed.update((sheet, key) for key in old_rows if key not in rows)
+
+        # Pages and the rows they were made from, set by affected_pages
+        self.pages: Dict[str, List[Source]] = {}
+
+    def __bool__(self):
+        return bool(self.added or self.modified or self.removed)
+
+    def affected_pages(self, graph: DependencyGraph) -> Set[str]:
+        """
+        Find the pages that have to be updated, either because one of their rows was added or modified,
+        or because they were made from a row that is now removed.
+        """
+        self.pages = graph.sources
+        affected = graph.pages_using(self.added | self.modified)
+        affected.update(page for page, sources in self.previous_pages.items()
+                        if page in graph.sources and any(tuple(source) in self.removed for source in sources))
+        return affected
+
+    def summary(self) -> str:
+        return f"{len(self.added)} rows added, {len(self.modified)} modified, {len(self.removed)} removed"
+
+
+def fingerprint(row: Row) -> str:
+    return sha256(json.dumps(row, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def sheet_fingerprints(sheet: str) -> Dict[str, str]:
+    key = NATURAL_KEYS[sheet]
+    # Rows without a key are empty or headers, they can't be tracked
+    return {row[key]: fingerprint(row) for row in dataset.load(sheet) if row[key] != ""}
+
+
+def detect_changes() -> Changes:
+    try:
+        with open(FINGERPRINT_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        # Nothing was recorded yet, so every row is new
+        state = {"rows": {}, "pages": {}}
+
+    current = {sheet: sheet_fingerprints(sheet) for sheet in NATURAL_KEYS}
+    return Changes(current, state["rows"], state["pages"])
+
+
+def save_changes(changes: Changes, failed_pages: Iterable[str] = ()) -> None:
+    """
+    Remember the current rows after a successful run, so the next run only handles what changed after it.
+    The rows of pages that failed are left out, the next run sees them as added and tries those pages again.
+    """
+    rows = {sheet: dict(fingerprints) for sheet, fingerprints in changes.current.items()}
+    for page in failed_pages:
+        for sheet, key in changes.pages.get(page, []):
+            rows.get(sheet, {}).pop(key, None)
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(FINGERPRINT_FILE + ".tmp", "w") as f:
+        json.dump({"rows": rows, "pages": changes.pages}, f)
+    os.replace(FINGERPRINT_FILE + ".tmp", FINGERPRINT_FILE)
+
+
+__all__ = ["Changes", "Source", "detect_changes", "save_changes"]
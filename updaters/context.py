@@ -0,0 +1,38 @@
+from typing import Any, Dict, Iterable, List
+
+
+class RunContext:
+    """
+    The pages a single run of an updater marks for update, and the data to update them with.
+    Use it as a context manager, everything it holds is released when the run ends,
+    so updaters can run any number of times in one process.
+    """
+    def __init__(self, groups: Iterable[str]):
+        # Page group -> pages of that group to update
+        self.pages_to_update: Dict[str, List[str]] = {group: [] for group in groups}
+        # Page -> data to update the page with
+        self.data_to_update: Dict[str, Any] = {}
+
+    def __enter__(self) -> "RunContext":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def mark_for_update(self, group: str, page: str, data: Any) -> None:
+        self.pages_to_update[group].append(page)
+        self.data_to_update[page] = data
+
+    def clear_marked(self) -> None:
+        """
+        Forget the pages marked so far, once they have been updated.
+        """
+        for pages in self.pages_to_update.values():
+            pages.clear()
+        self.data_to_update.clear()
+
+    def release(self) -> None:
+        self.clear_marked()
+
+
+__all__ = ["RunContext"]
@@ -0,0 +1,158 @@
+import csv
+import os
+import pickle
+from hashlib import sha256
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from .metrics import stage
+
+# A single row of a data sheet, column header -> cell
+Row = Dict[str, str]
+
+DATA_DIR = "data files"
+SNAPSHOT_DIR = ".dataset_cache"
+
+# Sheet name -> file in the data directory
+SHEETS = {
+    "asteroids": "Asteroid resources.csv",
+    "contracts": "Contracts.csv",
+    "equipment": "Equipment and blueprints.csv",
+    "recipes": "Manufacturing.csv",
+    "resources": "Resources.csv",
+    "stations": "Stations.csv",
+    "upgrades": "Freighter_Shuttle Upgrades.csv",
+}
+
+data_dir = DATA_DIR
+use_snapshots = True
+loaded_sheets: Dict[str, List[Row]] = {}
+load_lock = Lock()
+
+
+def set_data_dir(path: str) -> None:
+    """
+    Read the sheets from another directory, for example a synthetic data set.
+    """
+    global data_dir
+    with load_lock:
+        data_dir = path
+        loaded_sheets.clear()
+
+
+def set_snapshots(enabled: bool) -> None:
+    """
+    Turn the snapshots off to always parse the CSV files, for example to measure parsing.
+    """
+    global use_snapshots
+    use_snapshots = enabled
+
+
+def reload(sheets: Iterable[str]) -> None:
+    """
+    Read these sheets again on their next use, after their files changed.
+    """
+    with load_lock:
+        for sheet in sheets:
+            loaded_sheets.pop(sheet, None)
+
+
+def sheet_path(sheet: str) -> str:
+    return os.path.join(data_dir, SHEETS[sheet])
+
+
+def snapshot_path(sheet: str) -> str:
+    # Snapshots of different data directories should not overwrite each other
+    directory = sha256(os.path.abspath(data_dir).encode()).hexdigest()[:12]
+    return os.path.join(SNAPSHOT_DIR, directory, sheet + ".pickle")
+
+
+def read_snapshot(sheet: str, stat: os.stat_result) -> Optional[List[Row]]:
+    """
+    Get the rows of a sheet from its snapshot, if that was made from the current file.
+    """
+    try:
+        with open(snapshot_path(sheet), "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+    if snapshot["mtime"] == stat.st_mtime_ns and snapshot["size"] == stat.st_size:
+        return snapshot["rows"]
+    # Touched but possibly unchanged, compare the content
+    if snapshot["size"] == stat.st_size and snapshot["hash"] == file_hash(sheet_path(sheet)):
+        write_snapshot(sheet, stat, snapshot["hash"], snapshot["rows"])
+        return snapshot["rows"]
+    return None
+
+
+def write_snapshot(sheet: str, stat: os.stat_result, content_hash: str, rows: List[Row]) -> None:
+    path = snapshot_path(sheet)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump({"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": content_hash, "rows": rows}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return sha256(f.read()).hexdigest()
+
+
+def load(sheet: str) -> List[Row]:
+    """
+    Get all rows of a sheet. Every sheet is read once per process,
+    and only parsed again when the file changed since its last snapshot.
+    """
+    with load_lock:
+        if sheet not in loaded_sheets:
+            with stage("load"):
+                path = sheet_path(sheet)
+                stat = os.stat(path)
+                rows = read_snapshot(sheet, stat) if use_snapshots else None
+                if rows is None:
+                    with open(path) as f:
+                        rows = list(csv.DictReader(f))
+                    if use_snapshots:
+                        write_snapshot(sheet, stat, file_hash(path), rows)
+            loaded_sheets[sheet] = rows
+        return loaded_sheets[sheet]
+
+
+def asteroids() -> List[Row]:
+    # Filter empty rows, region headers and the stations
+    return [row for row in load("asteroids")
+            if row["In-Game ID"] != "" and row["Internal id"] != "" and row["Composition"] != "Station"]
+
+
+def contracts() -> List[Row]:
+    return load("contracts")
+
+
+def equipment() -> List[Row]:
+    # Filter empty rows
+    return [row for row in load("equipment") if row["Name"] != ""]
+
+
+def recipes() -> List[Row]:
+    # Filter empty rows
+    return [row for row in load("recipes") if row["Identifier"] != ""]
+
+
+def resources() -> List[Row]:
+    # Filter empty rows
+    return [row for row in load("resources") if row["Name"] != "" and row["Name"] != "-"]
+
+
+def stations() -> List[Row]:
+    # Filter not yet released stations
+    return [row for row in load("stations") if row["Depth (kkm)"] != ""]
+
+
+def upgrades() -> List[Row]:
+    return load("upgrades")
+
+
+__all__ = ["Row", "SHEETS", "set_data_dir", "set_snapshots", "reload", "load",
+           "asteroids", "contracts", "equipment", "recipes", "resources", "stations", "upgrades"]
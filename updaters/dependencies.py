@@ -0,0 +1,46 @@
+from types import ModuleType
+from typing import Dict, Iterable, List, Set, Tuple
+
+# A single row of a sheet, as (sheet, natural key)
+Source = Tuple[str, str]
+
+
+class DependencyGraph:
+    """
+    Every page of the given updaters, the rows it is made from, and the reverse: every page a row is used on.
+    Rows of one sheet can end up on the pages of another, like recipes on machine pages,
+    contracts on station pages and bots and deployables on salvage pages.
+    """
+    def __init__(self, updaters: Iterable[ModuleType]):
+        # Page -> rows it is made from
+        self.sources: Dict[str, List[Source]] = {}
+        # Page -> updater making it
+        self.updaters: Dict[str, ModuleType] = {}
+        # Row -> pages made from it
+        self.pages: Dict[Source, Set[str]] = {}
+
+        for updater in updaters:
+            for page, sources in updater.page_dependencies().items():
+                self.sources[page] = sources
+                self.updaters[page] = updater
+                for source in sources:
+                    self.pages.setdefault(source, set()).add(page)
+
+    def pages_using(self, sources: Iterable[Source]) -> Set[str]:
+        pages = set()
+        for source in sources:
+            pages.update(self.pages.get(tuple(source), ()))
+        return pages
+
+    def by_updater(self, pages: Iterable[str]) -> Dict[ModuleType, Set[str]]:
+        """
+        Split pages over the updaters that make them, pages no updater makes are left out.
+        """
+        split = {}
+        for page in pages:
+            if page in self.updaters:
+                split.setdefault(self.updaters[page], set()).add(page)
+        return split
+
+
+__all__ = ["Source", "DependencyGraph"]
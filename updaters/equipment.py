@@ -1,18 +1,13 @@
-import csv
-from typing import Dict, List, Union
-
-from .util import create_page, page_exists, run_template_modifier, database_update
-from mwcleric import TemplateModifierBase
-from mwparserfromhell.nodes import Template
-
-pages_to_update = {
-    "simple": [],
-    "structure": [],
-    "leveled tool": [],
-    "modification": [],
-    "machine": [],
-}
-data_to_update = {}
+from typing import TYPE_CHECKING, Any, Collection, Dict, List, Optional, Union
+
+from . import dataset
+from .dependencies import Source
+from .context import RunContext
+from .metrics import measure_updater, stage
+from .util import InfoboxModifier, create_or_mark_pages, bulk_database_update, render_groups, select_pages
+
+if TYPE_CHECKING:
+    from mwparserfromhell.nodes import Template
 
 
 def construct_page_title(entry: Dict[str, str]) -> str:
@@ -25,8 +20,8 @@ def construct_page_title(entry: Dict[str, str]) -> str:
     return entry["Type"] + "/" + entry["Name"]
 
 
-def make_simple_page(title: str, entry: Dict[str, str]) -> None:
-    create_page(title, f"""{{{{Stub}}}}
+def render_simple_page(entry: Dict[str, str]) -> str:
+    return f"""{{{{Stub}}}}
 {{{{Beta content}}}}
 {{{{Equipment Infobox
 |Name={entry["Name"]}
@@ -40,11 +35,11 @@ def make_simple_page(title: str, entry: Dict[str, str]) -> None:
 {entry["Description"]} It can be purchased at the {entry["Console"]} console in the {entry["Tab"]} tab.
 
 {{{{Main site nav}}}}
-""")
+"""
 
 
-def make_structure_page(title: str, entry: Dict[str, str]) -> None:
-    create_page(title, f"""{{{{Stub}}}}
+def render_structure_page(entry: Dict[str, str]) -> str:
+    return f"""{{{{Stub}}}}
 {{{{Beta content}}}}
 {{{{Equipment Infobox/Structure
 |Name={entry["Name"]}
@@ -58,11 +53,11 @@ def make_structure_page(title: str, entry: Dict[str, str]) -> None:
 {entry["Description"]} It can be purchased at the {entry["Console"]} console in the {entry["Tab"]} tab.
 
 {{{{Main site nav}}}}
-""")
+"""
 
 
-def make_tool_page(title: str, entries: List[Dict[str, str]]) -> None:
-    create_page(title, f"""{{{{Cleanup}}}}
+def render_tool_page(entries: List[Dict[str, str]]) -> str:
+    return f"""{{{{Cleanup}}}}
 {{{{Beta content}}}}
 {{{{Equipment Infobox/Tool
 |Name={entries[0]['Group']}
@@ -79,12 +74,12 @@ def make_tool_page(title: str, entries: List[Dict[str, str]]) -> None:
 It can be purchased at the {entries[0]['Console']} console in the {entries[0]['Tab']} tab.
 
 {{{{Main site nav}}}}
-""")
+"""
 
 
-def make_modification_page(title: str, entries: List[Dict[str, str]]) -> None:
+def render_modification_page(entries: List[Dict[str, str]]) -> str:
     # This should be changed when there are multiple modifications for the same group
-    create_page(title, f"""{{{{Stub}}}}
+    return f"""{{{{Stub}}}}
 {{{{Beta content}}}}
 {{{{Equipment Infobox/Modification
 |Name={entries[0]["Group"]}
@@ -99,7 +94,7 @@ def make_modification_page(title: str, entries: List[Dict[str, str]]) -> None:
 It can be purchased at the {entries[0]['Console']} console in the {entries[0]['Tab']} tab.
 
 {{{{Main site nav}}}}
-""")
+"""
 
 
 def make_recipe(recipe: Dict[str, str]) -> str:
@@ -128,8 +123,8 @@ def make_recipe(recipe: Dict[str, str]) -> str:
 }}}}"""
 
 
-def make_machine_page(title: str, entry: Dict[str, Union[str, List[Dict[str, str]]]]):
-    create_page(title, f"""{{{{Cleanup}}}}
+def render_machine_page(entry: Dict[str, Union[str, List[Dict[str, str]]]]) -> str:
+    return f"""{{{{Cleanup}}}}
 {{{{Beta content}}}}
 {{{{Equipment Infobox/Manufacturing
 |Name={entry["Name"]}
@@ -146,16 +141,25 @@ def make_machine_page(title: str, entry: Dict[str, Union[str, List[Dict[str, str
 {{{{Machine recipes table|{entry["Name"]}}}}}
 
 {{{{Main site nav}}}}
-""")
+"""
 
 
-class SimpleEquipmentModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
+# Page group -> function rendering a new page of that group
+renderers = {
+    "simple": render_simple_page,
+    "structure": render_structure_page,
+    "leveled tool": render_tool_page,
+    "modification": render_modification_page,
+    "machine": render_machine_page,
+}
+
 
-        super().__init__(site, template, **data)
+def render_pages(pages: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    return render_groups(pages, renderers)
 
-    def update_template(self, template: Template):
+
+class SimpleEquipmentModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -163,28 +167,21 @@ class SimpleEquipmentModifier(TemplateModifierBase):
 
         print("Updating Simple Equipment Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Category", info["Type"])
-        template.add("Station", info["Station Unlocked"])
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Category", info["Type"])
+        self.set_param(template, "Station", info["Station Unlocked"])
         if info["Special Unlock"]:
-            if template.has("Price"):
-                template.remove("Price")
-            template.add("Special Unlock", info["Special Unlock"])
+            self.remove_param(template, "Price")
+            self.set_param(template, "Special Unlock", info["Special Unlock"])
         else:
-            if template.has("Special Unlock"):
-                template.remove("Special Unlock")
-            template.add("Price", info["Price"])
-        template.add("Short Description", info["Short Description"])
-        template.add("In Game Description", info["In Game Description"])
-
+            self.remove_param(template, "Special Unlock")
+            self.set_param(template, "Price", info["Price"])
+        self.set_param(template, "Short Description", info["Short Description"])
+        self.set_param(template, "In Game Description", info["In Game Description"])
 
-class StructureEquipmentModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
 
-        super().__init__(site, template, **data)
-
-    def update_template(self, template: Template):
+class StructureEquipmentModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -192,28 +189,21 @@ class StructureEquipmentModifier(TemplateModifierBase):
 
         print("Updating Structure Equipment Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Station", info["Station Unlocked"])
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Station", info["Station Unlocked"])
         if info["Special Unlock"]:
-            if template.has("Price"):
-                template.remove("Price")
-            template.add("Special Unlock", info["Special Unlock"])
+            self.remove_param(template, "Price")
+            self.set_param(template, "Special Unlock", info["Special Unlock"])
         else:
-            if template.has("Special Unlock"):
-                template.remove("Special Unlock")
-            template.add("Price", info["Price"])
-        template.add("Build Cost", info["Build Cost"])
-        template.add("Short Description", info["Short Description"])
-        template.add("In Game Description", info["In Game Description"])
-
+            self.remove_param(template, "Special Unlock")
+            self.set_param(template, "Price", info["Price"])
+        self.set_param(template, "Build Cost", info["Build Cost"])
+        self.set_param(template, "Short Description", info["Short Description"])
+        self.set_param(template, "In Game Description", info["In Game Description"])
 
-class ToolEquipmentModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
 
-        super().__init__(site, template, **data)
-
-    def update_template(self, template: Template):
+class ToolEquipmentModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -221,22 +211,17 @@ class ToolEquipmentModifier(TemplateModifierBase):
 
         print("Updating Tool Equipment Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info[0]["Group"])
-        template.add('tabs', ','.join([entry['Variant'] for entry in info]))
-        template.add('Stations', ';;'.join([entry['Station Unlocked'] for entry in info]))
-        template.add('Special Unlocks', ';;'.join([entry['Special Unlock'] for entry in info]))
-        template.add('Prices', ';;'.join([entry['Price'] for entry in info]))
-        template.add('Short Descriptions', ';;'.join([entry['Short Description'] for entry in info]))
-        template.add('In Game Descriptions', ';;'.join([entry['In Game Description'] for entry in info]))
-
-
-class ModificationEquipmentModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
+        self.set_param(template, "Name", info[0]["Group"])
+        self.set_param(template, 'tabs', ','.join([entry['Variant'] for entry in info]))
+        self.set_param(template, 'Stations', ';;'.join([entry['Station Unlocked'] for entry in info]))
+        self.set_param(template, 'Special Unlocks', ';;'.join([entry['Special Unlock'] for entry in info]))
+        self.set_param(template, 'Prices', ';;'.join([entry['Price'] for entry in info]))
+        self.set_param(template, 'Short Descriptions', ';;'.join([entry['Short Description'] for entry in info]))
+        self.set_param(template, 'In Game Descriptions', ';;'.join([entry['In Game Description'] for entry in info]))
 
-        super().__init__(site, template, **data)
 
-    def update_template(self, template: Template):
+class ModificationEquipmentModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -245,20 +230,15 @@ class ModificationEquipmentModifier(TemplateModifierBase):
         # change this when there are multiple pieces of equipment in a modification group
         print("Updating Modification Equipment Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info[0]["Group"])
-        template.add("Station", info[0]["Station Unlocked"])
-        template.add("Price", info[0]["Price"])
-        template.add("Short Description", info[0]["Short Description"])
-        template.add("In Game Description", info[0]["In Game Description"])
-
-
-class MachineEquipmentModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
+        self.set_param(template, "Name", info[0]["Group"])
+        self.set_param(template, "Station", info[0]["Station Unlocked"])
+        self.set_param(template, "Price", info[0]["Price"])
+        self.set_param(template, "Short Description", info[0]["Short Description"])
+        self.set_param(template, "In Game Description", info[0]["In Game Description"])
 
-        super().__init__(site, template, **data)
 
-    def update_template(self, template: Template):
+class MachineEquipmentModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -267,27 +247,20 @@ class MachineEquipmentModifier(TemplateModifierBase):
         # change this when there are multiple pieces of equipment in a modification group
         print("Updating Manufacturing Equipment Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Station", info["Station Unlocked"])
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Station", info["Station Unlocked"])
         if info["Special Unlock"]:
-            if template.has("Price"):
-                template.remove("Price")
-            template.add("Special Unlock", info["Special Unlock"])
+            self.remove_param(template, "Price")
+            self.set_param(template, "Special Unlock", info["Special Unlock"])
         else:
-            if template.has("Special Unlock"):
-                template.remove("Special Unlock")
-            template.add("Price", info["Price"])
-        template.add("Short Description", info["Short Description"])
-        template.add("In Game Description", info["In Game Description"])
-        template.add("Recipes", ';;'.join([make_recipe(r) for r in info["Recipes"]]))
+            self.remove_param(template, "Special Unlock")
+            self.set_param(template, "Price", info["Price"])
+        self.set_param(template, "Short Description", info["Short Description"])
+        self.set_param(template, "In Game Description", info["In Game Description"])
+        self.set_param(template, "Recipes", ';;'.join([make_recipe(r) for r in info["Recipes"]]))
 
 
-def run():
-    with open("data files/Equipment and blueprints.csv") as f:
-        equipment_data = [row for row in csv.DictReader(f) if row["Name"] != ""]
-    with open("data files/Manufacturing.csv") as f:
-        recipe_data = [row for row in csv.DictReader(f) if row["Identifier"] != ""]
-
+def collect_pages() -> Dict[str, Dict[str, Any]]:
     pages = {
         "simple": {},
         "structure": {},
@@ -297,7 +270,7 @@ def run():
     }
 
     # Preprocess data
-    for entry in equipment_data:
+    for entry in dataset.equipment():
         page = construct_page_title(entry)
 
         if entry["Type"] == "Tool" and entry["Name"].find(" Lvl") > -1:
@@ -312,90 +285,67 @@ def run():
         elif entry["Type"] == "Structure":
             pages["structure"][page] = entry
         elif entry["Type"] == "Manufacturing":
-            pages["machine"][page] = entry
-            pages["machine"][page]["Recipes"] = []
+            # Copy the row, the shared data set should not get the recipes
+            pages["machine"][page] = dict(entry, Recipes=[])
         else:
             pages["simple"][page] = entry
 
-    for entry in recipe_data:
+    for entry in dataset.recipes():
         page = "Manufacturing/" + entry["Machine"]
         pages["machine"][page]["Recipes"].append(entry)
 
-    # Make new pages or mark for update
-    for page, data in pages["simple"].items():
-        if page_exists(page):
-            pages_to_update["simple"].append(page)
-            data_to_update[page] = data
-        else:
-            make_simple_page(page, data)
+    return pages
 
-    for page, data in pages["structure"].items():
-        if page_exists(page):
-            pages_to_update["structure"].append(page)
-            data_to_update[page] = data
-        else:
-            make_structure_page(page, data)
 
-    for page, data in pages["leveled tool"].items():
-        if page_exists(page):
-            pages_to_update["leveled tool"].append(page)
-            data_to_update[page] = data
-        else:
-            make_tool_page(page, data)
+def page_sources(data: Union[Dict[str, Any], List[Dict[str, str]]]) -> List[Source]:
+    entries = data if isinstance(data, list) else [data]
+    sources = [("equipment", entry["Name"]) for entry in entries]
+    for entry in entries:
+        sources += [("recipes", recipe["Identifier"]) for recipe in entry.get("Recipes", [])]
+    return sources
 
-    for page, data in pages["modification"].items():
-        if page_exists(page):
-            pages_to_update["modification"].append(page)
-            data_to_update[page] = data
-        else:
-            make_modification_page(page, data)
 
-    for page, data in pages["machine"].items():
-        if page_exists(page):
-            pages_to_update["machine"].append(page)
-            data_to_update[page] = data
-        else:
-            make_machine_page(page, data)
-
-    modifier_class = {
-        "simple": SimpleEquipmentModifier,
-        "structure": StructureEquipmentModifier,
-        "leveled tool": ToolEquipmentModifier,
-        "modification": ModificationEquipmentModifier,
-        "machine": MachineEquipmentModifier,
-    }
+def page_dependencies() -> Dict[str, List[Source]]:
+    return {page: page_sources(data) for group in collect_pages().values() for page, data in group.items()}
 
-    modifier_name = {
-        "simple": "Equipment Infobox",
-        "structure": "Equipment Infobox/Structure",
-        "leveled tool": "Equipment Infobox/Tool",
-        "modification": "Equipment Infobox/Modification",
-        "machine": "Equipment Infobox/Manufacturing",
-    }
 
-    for group in pages_to_update.keys():
-        if len(pages_to_update[group]) > 0:
-            run_template_modifier(
-                modifier_class[group],
-                modifier_name[group],
-                pages_to_update[group],
-                "Automatic update from new data, "
-                "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-                new_data=data_to_update
-            )
+def run(only: Optional[Collection[str]] = None):
+    with measure_updater("equipment"), stage("render"):
+        pages = {group: select_pages(data, only) for group, data in collect_pages().items()}
+
+        with RunContext(pages.keys()) as context:
+            update_pages(context, pages)
+
+
+templates = {
+    "simple": "Equipment Infobox",
+    "structure": "Equipment Infobox/Structure",
+    "leveled tool": "Equipment Infobox/Tool",
+    "modification": "Equipment Infobox/Modification",
+    "machine": "Equipment Infobox/Manufacturing",
+}
+
+modifiers = {
+    "simple": SimpleEquipmentModifier,
+    "structure": StructureEquipmentModifier,
+    "leveled tool": ToolEquipmentModifier,
+    "modification": ModificationEquipmentModifier,
+    "machine": MachineEquipmentModifier,
+}
+
+
+def update_pages(context: RunContext, pages: Dict[str, Dict[str, Any]]):
+    # Make new pages or mark for update
+    create_or_mark_pages(context, pages, renderers, templates, modifiers)
+
+
+def database_titles() -> List[str]:
+    # Variants share a page, make sure they don't cause multiple updates
+    return list(dict.fromkeys(construct_page_title(row) for row in dataset.equipment()))
 
 
 def force_database_update():
-    updated = []
-    with open("data files/Equipment and blueprints.csv") as f:
-        for row in csv.DictReader(f):
-            # Filter empty rows
-            if row["Name"] != "":
-                title = construct_page_title(row)
-                if title not in updated:
-                    # Make sure variants don't cause multiple updates
-                    database_update(title)
-                    updated.append(title)
-
-
-__all__ = ["run", "force_database_update"]
+    bulk_database_update(database_titles())
+
+
+__all__ = ["run", "collect_pages", "render_pages", "page_dependencies", "database_titles", "force_database_update"]
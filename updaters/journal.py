@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from hashlib import sha256
+from threading import Lock
+from typing import IO, Dict, Iterator, Optional
+
+from . import dataset
+from .changes import STATE_DIR
+from .metrics import current_updater
+
+JOURNAL_DIR = os.path.join(STATE_DIR, "journal")
+
+
+class Journal:
+    """
+    The pages a run has finished, one append-only file per updater with a line per page
+    holding its title and the hash of the content it was left with.
+    Every line is flushed to disk before the run moves on, so the journal survives a crash of the run.
+
+    A journal is only resumed when the data files are still the same as when it was started,
+    otherwise finished pages could have been made from outdated rows.
+    """
+    def __init__(self, directory: str, data_hash: str, resume: bool):
+        self.directory = directory
+        self.data_hash = data_hash
+        self.lock = Lock()
+        # Updater -> page -> hash of its content
+        self.done: Dict[str, Dict[str, Optional[str]]] = {}
+        self.files: Dict[str, IO[str]] = {}
+
+        if resume:
+            self.load()
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def load(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        for file_name in os.listdir(self.directory):
+            updater = file_name[:-len(".jsonl")]
+            with open(os.path.join(self.directory, file_name), encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            if not lines or json.loads(lines[0]).get("data") != self.data_hash:
+                print("Data changed since the journal of %s was started, starting over" % updater)
+                os.remove(os.path.join(self.directory, file_name))
+                continue
+
+            done = self.done.setdefault(updater, {})
+            for line in lines[1:]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line can be cut off by a crash
+                    continue
+                done[entry["title"]] = entry["hash"]
+
+    def is_done(self, updater: str, title: str) -> bool:
+        return title in self.done.get(updater, {})
+
+    def record(self, updater: str, title: str, content_hash: Optional[str]) -> None:
+        with self.lock:
+            if updater not in self.files:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, updater + ".jsonl")
+                new = not os.path.exists(path)
+                self.files[updater] = open(path, "a", encoding="utf-8")
+                if new:
+                    self.write(self.files[updater], {"data": self.data_hash})
+            self.write(self.files[updater], {"title": title, "hash": content_hash})
+            self.done.setdefault(updater, {})[title] = content_hash
+
+    @staticmethod
+    def write(f: IO[str], entry: dict) -> None:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    def close(self) -> None:
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files.clear()
+
+    def finish(self) -> None:
+        """
+        Remove the journal after a successful run, the next run starts from scratch.
+        """
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# Journal of the current run, if the run keeps one
+journal: Optional[Journal] = None
+
+
+def data_hash() -> str:
+    digest = sha256()
+    for sheet in sorted(dataset.SHEETS):
+        digest.update(dataset.file_hash(dataset.sheet_path(sheet)).encode())
+    return digest.hexdigest()[:16]
+
+
+def content_hash(content: str) -> str:
+    return sha256(content.encode()).hexdigest()[:16]
+
+
+@contextmanager
+def journaled(resume: bool = False) -> Iterator[None]:
+    """
+    Keep a journal of the pages finished in this block.
+    It is removed when the block completes and kept when it fails, so a resumed run can skip the finished pages.
+
+    :param resume: Skip the pages the journal of a failed earlier run has as finished
+    """
+    global journal
+    journal = Journal(JOURNAL_DIR, data_hash(), resume)
+    try:
+        yield
+    except BaseException:
+        journal.close()
+        raise
+    else:
+        journal.finish()
+    finally:
+        journal = None
+
+
+def is_done(title: str) -> bool:
+    """
+    Whether the current updater already finished this page in the run that is resumed.
+    """
+    return journal is not None and journal.is_done(current_updater.get(), title)
+
+
+def record_done(title: str, content: Optional[str] = None) -> None:
+    """
+    Record that the current updater finished a page, leaving it with this content if it is known.
+    """
+    if journal is not None:
+        journal.record(current_updater.get(), title, content_hash(content) if content is not None else None)
+
+
+__all__ = ["Journal", "journaled", "is_done", "record_done"]
@@ -0,0 +1,264 @@
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock, get_ident
+from time import perf_counter
+from typing import Dict, Iterator, Optional, Tuple
+
+from .registry import import_seconds
+
+# Outcomes of handled pages, as counted by util.count_outcome
+OUTCOMES = ["created", "updated", "unchanged", "refreshed", "failed", "resumed"]
+
+# Prefix of every metric in the Prometheus textfile
+PROMETHEUS_PREFIX = "astronomics_updater"
+
+# Files the metrics of a run are written to, see set_metrics_files
+json_file: Optional[str] = None
+prometheus_file: Optional[str] = None
+
+
+class StageMetrics:
+    """
+    Everything one stage of one updater cost.
+    The seconds are busy time summed over every thread working on the stage,
+    so with several workers they can add up to more than the wall time of the updater.
+    """
+    def __init__(self):
+        self.seconds = 0.0
+        self.api_calls = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.outcomes: Dict[str, int] = {outcome: 0 for outcome in OUTCOMES}
+
+    def as_dict(self) -> dict:
+        return {
+            "seconds": self.seconds,
+            "api_calls": self.api_calls,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            **self.outcomes,
+        }
+
+
+class StageTimer:
+    """
+    The stage a thread is working on, stopped while the thread works on a nested stage or waits on other threads.
+    """
+    def __init__(self, key: Tuple[str, str]):
+        self.key = key
+        self.thread = get_ident()
+        self.started: Optional[float] = perf_counter()
+
+    def stop(self) -> None:
+        if self.started is not None:
+            add_seconds(self.key, perf_counter() - self.started)
+            self.started = None
+
+    def resume(self) -> None:
+        self.started = perf_counter()
+
+
+# Updater and stage the current thread works for, copied into the worker threads by the scheduler
+current_updater: ContextVar[str] = ContextVar("current_updater", default="none")
+current_timer: ContextVar[Optional[StageTimer]] = ContextVar("current_timer", default=None)
+
+# (updater, stage) -> what it cost, and updater -> wall time
+stage_metrics: Dict[Tuple[str, str], StageMetrics] = {}
+updater_seconds: Dict[str, float] = {}
+metrics_lock = Lock()
+
+
+def set_metrics_files(json_path: Optional[str] = None, prometheus_path: Optional[str] = None) -> None:
+    """
+    Write the metrics of every run to a JSON summary and/or a Prometheus textfile, or nowhere if not given.
+    """
+    global json_file, prometheus_file
+    json_file = json_path
+    prometheus_file = prometheus_path
+
+
+def reset_metrics() -> None:
+    with metrics_lock:
+        stage_metrics.clear()
+        updater_seconds.clear()
+
+
+def current_stage() -> Tuple[str, str]:
+    timer = current_timer.get()
+    return timer.key if timer is not None else (current_updater.get(), "none")
+
+
+def metrics_for(key: Tuple[str, str]) -> StageMetrics:
+    # Call with the lock held
+    if key not in stage_metrics:
+        stage_metrics[key] = StageMetrics()
+    return stage_metrics[key]
+
+
+def add_seconds(key: Tuple[str, str], seconds: float) -> None:
+    with metrics_lock:
+        metrics_for(key).seconds += seconds
+
+
+def record_call(bytes_sent: int = 0, bytes_received: int = 0) -> None:
+    """
+    Count an API call, and the bytes of its request and response, for the current stage.
+    """
+    with metrics_lock:
+        metrics = metrics_for(current_stage())
+        metrics.api_calls += 1
+        metrics.bytes_sent += bytes_sent
+        metrics.bytes_received += bytes_received
+
+
+def record_outcome(outcome: str) -> None:
+    with metrics_lock:
+        metrics_for(current_stage()).outcomes[outcome] += 1
+
+
+@contextmanager
+def measure_updater(name: str) -> Iterator[None]:
+    """
+    Count everything done in this block, also on worker threads, for an updater, and time the block.
+    """
+    updater_token = current_updater.set(name)
+    timer_token = current_timer.set(None)
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        current_timer.reset(timer_token)
+        current_updater.reset(updater_token)
+        with metrics_lock:
+            updater_seconds[name] = updater_seconds.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Count everything done in this block for a stage of the current updater.
+    The time spent in nested stages only counts for the nested stage.
+    """
+    parent = current_timer.get()
+    # A stage started on another thread keeps running, that thread is waiting on this one
+    if parent is not None and parent.thread != get_ident():
+        parent = None
+    if parent is not None:
+        parent.stop()
+
+    timer = StageTimer((current_updater.get(), name))
+    token = current_timer.set(timer)
+    try:
+        yield
+    finally:
+        timer.stop()
+        current_timer.reset(token)
+        if parent is not None:
+            parent.resume()
+
+
+@contextmanager
+def paused() -> Iterator[None]:
+    """
+    Stop timing the current stage of this thread, while it waits on work done by other threads.
+    """
+    timer = current_timer.get()
+    if timer is None or timer.thread != get_ident():
+        yield
+        return
+    timer.stop()
+    try:
+        yield
+    finally:
+        timer.resume()
+
+
+def summary() -> dict:
+    """
+    The metrics of every updater, per stage and in total.
+    """
+    with metrics_lock:
+        updaters: Dict[str, dict] = {}
+        for (updater, stage_name), metrics in sorted(stage_metrics.items()):
+            entry = updaters.setdefault(updater, {"seconds": updater_seconds.get(updater, 0.0), "stages": {}})
+            entry["stages"][stage_name] = metrics.as_dict()
+        for updater, seconds in updater_seconds.items():
+            updaters.setdefault(updater, {"seconds": seconds, "stages": {}})
+
+    for entry in updaters.values():
+        entry["total"] = {field: sum(stage_values[field] for stage_values in entry["stages"].values())
+                          for field in StageMetrics().as_dict()}
+    return {"updaters": updaters, "imports": dict(import_seconds)}
+
+
+def prometheus_text(metrics: dict) -> str:
+    """
+    Format a summary in the Prometheus text format, as read by the textfile collector of the node exporter.
+    """
+    lines = [
+        f"# HELP {PROMETHEUS_PREFIX}_seconds Wall time of the last run of an updater.",
+        f"# TYPE {PROMETHEUS_PREFIX}_seconds gauge",
+    ]
+    for updater, entry in metrics["updaters"].items():
+        lines.append(f'{PROMETHEUS_PREFIX}_seconds{{updater="{updater}"}} {entry["seconds"]}')
+
+    fields = [
+        ("stage_seconds", "seconds", "Busy time of a stage, summed over its threads."),
+        ("api_calls", "api_calls", "API calls made in a stage."),
+        ("bytes_sent", "bytes_sent", "Bytes sent to the wiki in a stage."),
+        ("bytes_received", "bytes_received", "Bytes received from the wiki in a stage."),
+    ]
+    for metric, field, description in fields:
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{metric} {description}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{metric} gauge")
+        for updater, entry in metrics["updaters"].items():
+            for stage_name, values in entry["stages"].items():
+                lines.append(f'{PROMETHEUS_PREFIX}_{metric}{{updater="{updater}",stage="{stage_name}"}} '
+                             f'{values[field]}')
+
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_import_seconds Time the first import of a module took.")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_import_seconds gauge")
+    for module, seconds in metrics["imports"].items():
+        lines.append(f'{PROMETHEUS_PREFIX}_import_seconds{{module="{module}"}} {seconds}')
+
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_pages Pages handled in a stage, by outcome.")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_pages gauge")
+    for updater, entry in metrics["updaters"].items():
+        for stage_name, values in entry["stages"].items():
+            for outcome in OUTCOMES:
+                if values[outcome]:
+                    lines.append(f'{PROMETHEUS_PREFIX}_pages{{updater="{updater}",stage="{stage_name}",'
+                                 f'outcome="{outcome}"}} {values[outcome]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path: str, content: str) -> None:
+    # Written next to the file and moved over it, so readers never see half a file
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(path + ".tmp", path)
+
+
+def write_metrics() -> None:
+    """
+    Write the metrics of the run to the files set with set_metrics_files.
+    """
+    if json_file is None and prometheus_file is None:
+        return
+    metrics = summary()
+    if json_file is not None:
+        write_file(json_file, json.dumps(metrics, indent=2) + "\n")
+    if prometheus_file is not None:
+        write_file(prometheus_file, prometheus_text(metrics))
+
+
+__all__ = [
+    "set_metrics_files", "reset_metrics", "record_call", "record_outcome", "measure_updater", "stage", "paused",
+    "summary", "prometheus_text", "write_metrics",
+]
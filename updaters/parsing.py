@@ -0,0 +1,111 @@
+import copy
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from .backend import Page
+from .registry import timed_import
+from .scheduler import split_batches
+
+if TYPE_CHECKING:
+    from .util import InfoboxModifier
+
+# Processes parsing and rewriting pages, 0 parses on the thread handling the page, see set_parse_processes
+parse_processes = 0
+
+pool: Optional[ProcessPoolExecutor] = None
+pool_lock = Lock()
+
+
+def set_parse_processes(process_count: int) -> None:
+    """
+    Parse and rewrite fetched pages on this many processes, using more cores than the threads can.
+    Every modifier given to them is pickled, with only the data of the pages it is sent with.
+    """
+    global parse_processes, pool
+    with pool_lock:
+        parse_processes = max(0, process_count)
+        if pool is not None:
+            pool.shutdown()
+            pool = None
+
+
+def parse_pool() -> Optional[ProcessPoolExecutor]:
+    global pool
+    with pool_lock:
+        if pool is None and parse_processes:
+            # Spawned rather than forked, forking copies the locks other threads hold at that moment
+            pool = ProcessPoolExecutor(parse_processes, mp_context=multiprocessing.get_context("spawn"))
+        return pool
+
+
+def rewrite_page(page: Page, modifiers: List["InfoboxModifier"]) -> Optional[str]:
+    """
+    Let every modifier update its template on a page.
+
+    :return: The new text of the page, or None if it is unchanged
+    """
+    for modifier in modifiers:
+        modifier.page_changed = False
+        modifier.current_page = page
+
+    wikitext = timed_import("mwparserfromhell").parse(page.text)
+    for template in wikitext.filter_templates(recursive=True):
+        for modifier in modifiers:
+            if template.name.matches(modifier.template_name):
+                modifier.update_template(template)
+
+    if not any(modifier.page_changed for modifier in modifiers):
+        return None
+    return str(wikitext)
+
+
+def rewrite_pages(pages: List[Page], modifiers: List[List["InfoboxModifier"]]) -> List[Optional[str]]:
+    return [rewrite_page(page, page_modifiers) for page, page_modifiers in zip(pages, modifiers)]
+
+
+def for_pages(pages: List[Page], modifiers: List[List["InfoboxModifier"]]) -> List[List["InfoboxModifier"]]:
+    # Sent to a process with the data of these pages only, instead of the data of every page,
+    # and every modifier only once however many of the pages use it
+    copies = {}
+    for page_modifiers in modifiers:
+        for modifier in page_modifiers:
+            if id(modifier) in copies:
+                continue
+            sent = copy.copy(modifier)
+            sent.new_data = {page.page_title: modifier.new_data[page.page_title]
+                             for page in pages if page.page_title in modifier.new_data}
+            sent.title_list = []
+            sent.current_page = None
+            copies[id(modifier)] = sent
+    return [[copies[id(modifier)] for modifier in page_modifiers] for page_modifiers in modifiers]
+
+
+def start_rewrites(pages: List[Page], modifiers: List[List["InfoboxModifier"]]) \
+        -> List[Callable[[], Optional[str]]]:
+    """
+    Start rewriting pages, every page with its own list of modifiers, on the parse processes.
+    The pages are split in a part per process, each sent in one go.
+    Without parse processes every page is rewritten on the calling thread when its result is asked for.
+
+    :return: Per page a function waiting for its new text, or None if it is unchanged
+    """
+    processes = parse_pool()
+    if processes is None:
+        return [partial(rewrite_page, page, page_modifiers) for page, page_modifiers in zip(pages, modifiers)]
+
+    rewrites = []
+    for part in split_batches(list(range(len(pages))), parse_processes):
+        part_pages = [pages[i] for i in part]
+        future = processes.submit(rewrite_pages, part_pages, for_pages(part_pages, [modifiers[i] for i in part]))
+        rewrites += [partial(part_result, future, index) for index in range(len(part))]
+    return rewrites
+
+
+def part_result(future: Future, index: int) -> Optional[str]:
+    return future.result()[index]
+
+
+__all__ = ["set_parse_processes", "rewrite_page", "start_rewrites"]
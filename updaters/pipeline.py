@@ -0,0 +1,87 @@
+from contextvars import copy_context
+from queue import Queue
+from threading import Event, Thread
+from typing import Callable, List, TypeVar
+
+from . import scheduler
+from .metrics import paused
+
+T = TypeVar("T")
+
+# Items waiting between two stages, what a run holds at once no longer grows with the data
+DEFAULT_QUEUE_DEPTH = 4
+
+queue_depth = DEFAULT_QUEUE_DEPTH
+
+# Put after the last item of a stage
+DONE = object()
+
+
+class Stopped(Exception):
+    """
+    Raised in a producing stage when the stage after it failed, so it stops as well.
+    """
+
+
+def set_queue_depth(depth: int) -> None:
+    global queue_depth
+    queue_depth = max(1, depth)
+
+
+def stream(produce: Callable[[Callable[[T], None]], None], consume: Callable[[T], None]) -> None:
+    """
+    Run produce on a thread of its own and consume every item it puts on the calling thread, while it goes on.
+    Puts wait while queue_depth items are waiting, so a fast producer can't run ahead of the consumer.
+    Streams can be nested, with the consumer of one stream putting the items of the next.
+
+    The first exception of either side is raised again here, the other side stops at its next item.
+    The producer runs in a copy of the caller's context, so its metrics count for the caller's updater.
+
+    With a single worker, like while profiling with cProfile, both sides run on the calling thread,
+    every item is consumed as soon as it is put.
+    """
+    if scheduler.workers == 1:
+        produce(consume)
+        return
+
+    items: Queue = Queue(queue_depth)
+    stopped = Event()
+    failure: List[BaseException] = []
+
+    def put(item: T) -> None:
+        if stopped.is_set():
+            raise Stopped()
+        items.put(item)
+
+    def run() -> None:
+        try:
+            produce(put)
+        except Stopped:
+            pass
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            items.put(DONE)
+
+    producer = Thread(target=copy_context().run, args=(run,), daemon=True)
+    producer.start()
+    try:
+        while True:
+            with paused():
+                item = items.get()
+            if item is DONE:
+                break
+            consume(item)
+    except BaseException:
+        # Let the producer finish its current item and stop at the next
+        stopped.set()
+        while items.get() is not DONE:
+            pass
+        raise
+    finally:
+        producer.join()
+    if failure:
+        raise failure[0]
+
+
+__all__ = ["set_queue_depth", "stream"]
@@ -0,0 +1,144 @@
+import concurrent.futures.thread
+import io
+import os
+import sys
+import threading
+from collections import Counter
+from threading import Event, Thread, get_ident
+from typing import Callable, Dict, List
+
+from . import scheduler
+
+# The profilers are imported when a profile is made, so the package imports quickly without them
+PROFILE_MODES = ["cprofile", "tracemalloc", "sample"]
+
+# Seconds between two samples of the sampling profiler
+SAMPLE_INTERVAL = 0.005
+
+# Threads whose innermost function is in one of these files are idle, waiting for work or on other threads
+IDLE_FILES = {threading.__file__, concurrent.futures.thread.__file__}
+
+
+class Sampler:
+    """
+    A sampling profiler: looks at the stack of every other thread at a fixed interval, leaving out idle threads.
+    It slows the profiled code down far less than cProfile and also sees the worker threads.
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        # Stack from the outermost to the innermost function -> times it was seen
+        self.stacks: Counter = Counter()
+        self.stopped = Event()
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        own_thread = get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread, frame in sys._current_frames().items():
+                if thread == own_thread or frame.f_code.co_filename in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """
+        The stacks in the folded format flame graph tools read, one "outer;...;inner count" line per stack.
+        """
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hot_functions(self, top: int) -> List[str]:
+        total = sum(self.stacks.values()) or 1
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+        return [f"{count / total:7.1%} {count:>7} {function}" for function, count in own.most_common(top)]
+
+
+def profile_cprofile(name: str, task: Callable[[], None], output_dir: str, top: int) -> List[str]:
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.runcall(task)
+    profiler.dump_stats(os.path.join(output_dir, name + ".prof"))
+
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats(pstats.SortKey.TIME).print_stats(top)
+    return stream.getvalue().splitlines()
+
+
+def profile_tracemalloc(name: str, task: Callable[[], None], output_dir: str, top: int) -> List[str]:
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        task()
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    snapshot.dump(os.path.join(output_dir, name + ".tracemalloc"))
+
+    return [f"Peak: {peak / 1024:.0f} KiB"] + [str(statistic) for statistic in snapshot.statistics("lineno")[:top]]
+
+
+def profile_sample(name: str, task: Callable[[], None], output_dir: str, top: int) -> List[str]:
+    sampler = Sampler()
+    sampler.start()
+    try:
+        task()
+    finally:
+        sampler.stop()
+    with open(os.path.join(output_dir, name + ".folded"), "w", encoding="utf-8") as f:
+        f.write(sampler.folded())
+
+    return [f"{sum(sampler.stacks.values())} samples"] + sampler.hot_functions(top)
+
+
+profilers = {
+    "cprofile": profile_cprofile,
+    "tracemalloc": profile_tracemalloc,
+    "sample": profile_sample,
+}
+
+
+def profile_tasks(tasks: Dict[str, Callable[[], None]], mode: str = "cprofile", output_dir: str = "profiles",
+                  top: int = 20) -> None:
+    """
+    Run the tasks one after the other, each under a profiler, and write a profile file per task
+    and a summary of the top hot functions of every task to <output_dir>/summary.txt.
+
+    cProfile only sees the thread it runs on, so in that mode the tasks run on a single worker.
+    """
+    if mode not in profilers:
+        raise ValueError(f"Unknown profile mode {mode}, use one of {', '.join(PROFILE_MODES)}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    workers = scheduler.workers
+    if mode == "cprofile":
+        scheduler.set_concurrency(1)
+    try:
+        summary = []
+        for name, task in tasks.items():
+            print(f"Profiling {name} ({mode})...")
+            summary += [f"== {name} ==", *profilers[mode](name, task, output_dir, top), ""]
+    finally:
+        scheduler.set_concurrency(workers)
+
+    with open(os.path.join(output_dir, "summary.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(summary))
+    print("\n".join(summary))
+
+
+__all__ = ["PROFILE_MODES", "Sampler", "profile_tasks"]
@@ -0,0 +1,43 @@
+import importlib
+import sys
+from time import perf_counter
+from types import ModuleType
+from typing import Dict, Iterable, List
+
+# Every updater module in this package, in the order they run
+UPDATERS = ["asteroids", "equipment", "resources", "stations", "upgrades"]
+
+# Module -> seconds its first import took
+import_seconds: Dict[str, float] = {}
+
+
+def timed_import(name: str) -> ModuleType:
+    """
+    Import a module on its first use and remember how long that took, later calls get the loaded module.
+    Used for the updaters and for heavy dependencies only some steps need, like the wiki client and the parser.
+    """
+    # Always go through the import system, it makes other threads wait while a module is still being imported
+    loaded = name in sys.modules
+    start = perf_counter()
+    module = importlib.import_module(name)
+    if not loaded:
+        import_seconds.setdefault(name, perf_counter() - start)
+    return module
+
+
+def load_updater(name: str) -> ModuleType:
+    if name not in UPDATERS:
+        raise ValueError(f"Unknown updater {name}, use one of {', '.join(UPDATERS)}")
+    return timed_import(f"{__package__}.{name}")
+
+
+def load_updaters(names: Iterable[str]) -> List[ModuleType]:
+    return [load_updater(name) for name in names]
+
+
+def print_import_times() -> None:
+    for name, seconds in sorted(import_seconds.items(), key=lambda item: -item[1]):
+        print(f"{seconds * 1000:9.1f} ms  {name}")
+
+
+__all__ = ["UPDATERS", "timed_import", "load_updater", "load_updaters", "print_import_times"]
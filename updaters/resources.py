@@ -1,30 +1,37 @@
-import csv
-from typing import Tuple
+from functools import partial
+from typing import TYPE_CHECKING, Collection, Dict, Iterable, List, Optional, Tuple
 
-from .util import create_page, page_exists, run_template_modifier, database_update
-from mwcleric import TemplateModifierBase
-from mwparserfromhell.nodes import Template
+from . import dataset
+from .dependencies import Source
+from .context import RunContext
+from .metrics import measure_updater, stage
+from .dataset import Row
+from .util import InfoboxModifier, create_or_mark_pages, bulk_database_update, render_groups, select_pages
+
+if TYPE_CHECKING:
+    from mwparserfromhell.nodes import Template
 
 prefix = "Resource/"
 
-pages_to_update = {
-    "generic": [],
-    "gem": [],
-    "liquid": [],
-    "manufacture": [],
-    "salvage": [],
-}
+# Salvage base name -> (equipment name, equipment type)
+SalvageEquipment = Dict[str, Tuple[str, str]]
 
-data_to_update = {}
 
+class ResourceRunContext(RunContext):
+    """
+    A run of the resource updater, which also needs the equipment every salvage comes from.
+    """
+    def __init__(self, groups: Iterable[str], salvage_equipment: SalvageEquipment):
+        super().__init__(groups)
+        self.salvage_equipment = salvage_equipment
 
-class GenericResourceModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
+    def release(self) -> None:
+        super().release()
+        self.salvage_equipment.clear()
 
-        super().__init__(site, template, **data)
 
-    def update_template(self, template: Template):
+class GenericResourceModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -32,20 +39,15 @@ class GenericResourceModifier(TemplateModifierBase):
 
         print("Updating Resource Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Abbreviation", info["Abbreviation"])
-        template.add("Gameplay Type", info["Gameplay Type"])
-        template.add("Credit Value Class", info["Credit Value Class"])
-        template.add("Cash Value", info["$ Value"])
-
-
-class GemResourceModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Abbreviation", info["Abbreviation"])
+        self.set_param(template, "Gameplay Type", info["Gameplay Type"])
+        self.set_param(template, "Credit Value Class", info["Credit Value Class"])
+        self.set_param(template, "Cash Value", info["$ Value"])
 
-        super().__init__(site, template, **data)
 
-    def update_template(self, template: Template):
+class GemResourceModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -53,18 +55,13 @@ class GemResourceModifier(TemplateModifierBase):
 
         print("Updating Gem Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"][:info["Name"].index("(") - 1])
-        template.add("Abbreviation", info["Abbreviation"])
-        template.add("Cash Value", info["$ Value"])
+        self.set_param(template, "Name", info["Name"][:info["Name"].index("(") - 1])
+        self.set_param(template, "Abbreviation", info["Abbreviation"])
+        self.set_param(template, "Cash Value", info["$ Value"])
 
 
-class LiquidResourceModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
-
-        super().__init__(site, template, **data)
-
-    def update_template(self, template: Template):
+class LiquidResourceModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -72,20 +69,15 @@ class LiquidResourceModifier(TemplateModifierBase):
 
         print("Updating Liquid Resource Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Abbreviation", info["Abbreviation"])
-        template.add("Credit Value Class", info["Credit Value Class"])
-        template.add("Cash Value", info["$ Value"])
-        template.add("Special Property", info["Special Effect"])
-
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Abbreviation", info["Abbreviation"])
+        self.set_param(template, "Credit Value Class", info["Credit Value Class"])
+        self.set_param(template, "Cash Value", info["$ Value"])
+        self.set_param(template, "Special Property", info["Special Effect"])
 
-class ManufacturedResourceModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
 
-        super().__init__(site, template, **data)
-
-    def update_template(self, template: Template):
+class ManufacturedResourceModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -93,19 +85,18 @@ class ManufacturedResourceModifier(TemplateModifierBase):
 
         print("Updating Manufactured Resource Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Abbreviation", info["Abbreviation"])
-        template.add("Credit Value Class", info["Credit Value Class"])
-        template.add("Cash Value", info["$ Value"])
-
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Abbreviation", info["Abbreviation"])
+        self.set_param(template, "Credit Value Class", info["Credit Value Class"])
+        self.set_param(template, "Cash Value", info["$ Value"])
 
-class SalvageModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
 
-        super().__init__(site, template, **data)
+class SalvageModifier(InfoboxModifier):
+    def __init__(self, *args, salvage_equipment: SalvageEquipment, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.salvage_equipment = salvage_equipment
 
-    def update_template(self, template: Template):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -113,11 +104,11 @@ class SalvageModifier(TemplateModifierBase):
 
         print("Updating Salvage Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        base_equipment, base_type = salvage_base_equipment(info["Name"])
-        template.add("Equipment Name", base_equipment)
-        template.add("Equipment Type", base_type)
-        template.add("Repair Cost", info["Repair Cost"])
+        self.set_param(template, "Name", info["Name"])
+        base_equipment, base_type = salvage_base_equipment(info["Name"], self.salvage_equipment)
+        self.set_param(template, "Equipment Name", base_equipment)
+        self.set_param(template, "Equipment Type", base_type)
+        self.set_param(template, "Repair Cost", info["Repair Cost"])
 
 
 def full_page(sub_page: str) -> str:
@@ -126,9 +117,42 @@ def full_page(sub_page: str) -> str:
     return prefix + sub_page
 
 
-def run():
-    with open("data files/Resources.csv") as f:
-        raw_resource_data = [row for row in csv.DictReader(f) if row["Name"] != "" and row["Name"] != "-"]
+def resource_page(data: dict) -> str:
+    if data["Gameplay Type"] == "Gem":
+        return full_page(data["Name"][:data["Name"].index("(") - 1])
+    return full_page(data["Name"])
+
+
+def is_released(data: dict) -> bool:
+    # Unknown (future content), Remains (handled by Gem), upcoming content and end of valid data
+    return not (data["Gameplay Type"] == "Unknown"
+                or data["Gameplay Type"] == "Remains"
+                or data["Gameplay Type"] == ""
+                or data["Found at"] == "Upcoming")
+
+
+def resource_group(data: dict) -> Optional[str]:
+    if data["Gameplay Type"] == "Salvage":
+        return "salvage"
+    elif data["Gameplay Type"] == "Gem":
+        return "gem"
+    elif data["Gameplay Type"] == "Liquid":
+        return "liquid"
+    elif data["Gameplay Type"] == "Manufactured":
+        return "manufacture"
+    elif not is_released(data):
+        return None
+    return "generic"
+
+
+def collect_pages() -> Dict[str, Dict[str, Row]]:
+    pages = {
+        "generic": {},
+        "gem": {},
+        "liquid": {},
+        "manufacture": {},
+        "salvage": {},
+    }
 
     # Column headers:
     # Name
@@ -142,97 +166,71 @@ def run():
     # Found at
 
     # Split into resource categories
-    for row in raw_resource_data:
-        if row["Gameplay Type"] == "Salvage":
-            salvage_resource(row)
-        elif row["Gameplay Type"] == "Gem":
-            gem_resource(row)
-        elif row["Gameplay Type"] == "Liquid":
-            liquid_resource(row)
-        elif row["Gameplay Type"] == "Manufactured":
-            manufactured_resource(row)
-        elif row["Gameplay Type"] == "Unknown" \
-                or row["Gameplay Type"] == "Remains" \
-                or row["Gameplay Type"] == "" \
-                or row["Found at"] == "Upcoming":
-            # Ignore Unknown (future content), Remains (handled by Gem), upcoming content and end of valid data
-            pass
-        else:
-            generic_resource(row)
-
-    if len(pages_to_update["generic"]) > 0:
-        run_template_modifier(
-            GenericResourceModifier,
-            "Resource Infobox",
-            pages_to_update["generic"],
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
-    if len(pages_to_update["gem"]) > 0:
-        run_template_modifier(
-            GemResourceModifier,
-            "Resource Infobox/Gem",
-            pages_to_update["gem"],
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
-    if len(pages_to_update["liquid"]) > 0:
-        run_template_modifier(
-            LiquidResourceModifier,
-            "Resource Infobox/Liquid",
-            pages_to_update["liquid"],
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
-    if len(pages_to_update["manufacture"]) > 0:
-        run_template_modifier(
-            ManufacturedResourceModifier,
-            "Resource Infobox/Manufactured",
-            pages_to_update["manufacture"],
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
-    if len(pages_to_update["salvage"]) > 0:
-        run_template_modifier(
-            SalvageModifier,
-            "Resource Infobox/Salvage",
-            pages_to_update["salvage"],
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
+    for row in dataset.resources():
+        group = resource_group(row)
+        if group is not None:
+            pages[group][resource_page(row)] = row
+    return pages
+
+
+def page_sources(data: Row) -> List[Source]:
+    return [("resources", data["Name"])]
+
+
+def page_dependencies() -> Dict[str, List[Source]]:
+    pages = collect_pages()
+    dependencies = {page: page_sources(data) for group in pages.values() for page, data in group.items()}
+
+    # Salvage pages also show the bot or deployable the salvage comes from
+    salvage_equipment = load_salvage_equipment(row["Name"] for row in pages["salvage"].values())
+    for page, data in pages["salvage"].items():
+        equipment_name, _ = salvage_base_equipment(data["Name"], salvage_equipment)
+        dependencies[page].append(("equipment", equipment_name))
+    return dependencies
+
+
+def run(only: Optional[Collection[str]] = None):
+    with measure_updater("resources"), stage("render"):
+        pages = {group: select_pages(data, only) for group, data in collect_pages().items()}
+
+        salvage_equipment = load_salvage_equipment(row["Name"] for row in pages["salvage"].values())
+        with ResourceRunContext(pages.keys(), salvage_equipment) as context:
+            update_pages(context, pages)
+
+
+templates = {
+    "generic": "Resource Infobox",
+    "gem": "Resource Infobox/Gem",
+    "liquid": "Resource Infobox/Liquid",
+    "manufacture": "Resource Infobox/Manufactured",
+    "salvage": "Resource Infobox/Salvage",
+}
+
+# The salvage modifier also needs the equipment of the run, see update_pages
+modifiers = {
+    "generic": GenericResourceModifier,
+    "gem": GemResourceModifier,
+    "liquid": LiquidResourceModifier,
+    "manufacture": ManufacturedResourceModifier,
+}
+
+
+def update_pages(context: ResourceRunContext, pages: Dict[str, Dict[str, Row]]):
+    group_renderers = dict(renderers, salvage=partial(render_salvage_page, salvage_equipment=context.salvage_equipment))
+    group_modifiers = dict(modifiers, salvage=partial(SalvageModifier, salvage_equipment=context.salvage_equipment))
+    create_or_mark_pages(context, pages, group_renderers, templates, group_modifiers)
+
+
+def database_titles() -> List[str]:
+    return [page for group in collect_pages().values() for page in group]
 
 
 def force_database_update():
-    with open("data files/Resources.csv") as f:
-        for row in csv.DictReader(f):
-            # Filter empty rows
-            if row["Name"] != "" and row["Name"] != "-":
-                # Filter future content
-                if row["Gameplay Type"] == "Unknown" \
-                        or row["Gameplay Type"] == "Remains" \
-                        or row["Gameplay Type"] == "" \
-                        or row["Found at"] == "Upcoming":
-                    continue
-                if row["Gameplay Type"] == "Gem":
-                    database_update(full_page(row["Name"][:row["Name"].index("(") - 1]))
-                else:
-                    database_update(full_page(row["Name"]))
-
-
-def generic_resource(data: dict):
-    page = full_page(data["Name"])
-    if page_exists(page):
-        # Update existing page
-        pages_to_update["generic"].append(page)
-        data_to_update[page] = data
-    else:
-        # Create new page
-        create_page(page, f"""{{{{Beta content}}}}
+    bulk_database_update(database_titles())
+
+
+def render_generic_page(data: dict) -> str:
+    return f"""{{{{Beta content}}}}
 {{{{Resource Infobox
 |Name={data["Name"]}
 |Abbreviation={data["Abbreviation"]}
@@ -245,20 +243,12 @@ def generic_resource(data: dict):
 {data["Name"]} can be found on {", ".join([f"{{{{Asteroid icon|{s}}}}}" for s in data["Found at"].split(", ")])}
 
 {{{{Main site nav}}}}
-""")
+"""
 
 
-def gem_resource(data: dict):
+def render_gem_page(data: dict) -> str:
     gem_name = data["Name"][:data["Name"].index("(") - 1]
-    page = full_page(gem_name)
-    if page_exists(page):
-        # Update existing page
-        pages_to_update["gem"].append(page)
-        data_to_update[page] = data
-    else:
-        # Create new page
-
-        create_page(page, f"""{{{{Beta content}}}}
+    return f"""{{{{Beta content}}}}
 {{{{Resource Infobox/Gem
 |Name={gem_name}
 |Abbreviation={data["Abbreviation"]}
@@ -267,18 +257,11 @@ def gem_resource(data: dict):
 {gem_name} can be found on {", ".join([f"{{{{Asteroid icon|{s}}}}}" for s in data["Found at"].split(", ")])}
 
 {{{{Main site nav}}}}
-}}}}""")
-
-
-def liquid_resource(data: dict):
-    page = full_page(data["Name"])
-    if page_exists(page):
-        # Update existing page
-        pages_to_update["liquid"].append(page)
-        data_to_update[page] = data
-    else:
-        # Create new page
-        create_page(page, f"""{{{{Beta content}}}}
+}}}}"""
+
+
+def render_liquid_page(data: dict) -> str:
+    return f"""{{{{Beta content}}}}
 {{{{Resource Infobox/Liquid
 |Name={data["Name"]}
 |Abbreviation={data["Abbreviation"]}
@@ -291,18 +274,11 @@ def liquid_resource(data: dict):
 {data["Name"]} can be found on {", ".join([f"{{{{Asteroid icon|{s}}}}}" for s in data["Found at"].split(", ")])}
 
 {{{{Main site nav}}}}
-""")
-
-
-def manufactured_resource(data: dict):
-    page = full_page(data["Name"])
-    if page_exists(page):
-        # Update existing page
-        pages_to_update["manufacture"].append(page)
-        data_to_update[page] = data
-    else:
-        # Create new page
-        create_page(page, f"""{{{{Beta content}}}}
+"""
+
+
+def render_manufactured_page(data: dict) -> str:
+    return f"""{{{{Beta content}}}}
 {{{{Resource Infobox/Manufactured
 |Name={data["Name"]}
 |Abbreviation={data["Abbreviation"]}
@@ -312,19 +288,12 @@ def manufactured_resource(data: dict):
 }}}}
 
 {{{{Main site nav}}}}
-""")
-
-
-def salvage_resource(data: dict):
-    page = full_page(data["Name"])
-    if page_exists(page):
-        # Update existing page
-        pages_to_update["salvage"].append(page)
-        data_to_update[page] = data
-    else:
-        # Create new page
-        base_equipment, equipment_type = salvage_base_equipment(data["Name"])
-        create_page(page, f"""{{{{Beta content}}}}
+"""
+
+
+def render_salvage_page(data: dict, salvage_equipment: SalvageEquipment) -> str:
+    base_equipment, equipment_type = salvage_base_equipment(data["Name"], salvage_equipment)
+    return f"""{{{{Beta content}}}}
 {{{{Salvage Infobox
 |Name={data["Name"]}
 |Equipment Name={base_equipment}
@@ -335,16 +304,48 @@ def salvage_resource(data: dict):
 The remains of a destroyed {{{{{equipment_type} icon|{base_equipment}}}}}. You can collect it and repair it at the station for a reduced cost.
 
 {{{{Main site nav}}}}
-""")
+"""
+
+
+# Page group -> function rendering a new page of that group, salvage also needs the equipment it comes from
+renderers = {
+    "generic": render_generic_page,
+    "gem": render_gem_page,
+    "liquid": render_liquid_page,
+    "manufacture": render_manufactured_page,
+}
+
+
+def render_pages(pages: Dict[str, Dict[str, Row]]) -> Dict[str, str]:
+    salvage_equipment = load_salvage_equipment(row["Name"] for row in pages["salvage"].values())
+    group_renderers = dict(renderers, salvage=partial(render_salvage_page, salvage_equipment=salvage_equipment))
+    return render_groups(pages, group_renderers)
+
+
+def salvage_base_name(name: str) -> str:
+    return name[:name.index("(") - 1]
+
+
+def load_salvage_equipment(salvage_names: Iterable[str]) -> SalvageEquipment:
+    """
+    Resolve the equipment every salvage comes from, so the equipment data is only searched once per run.
+    """
+    equipment = [(row["Name"], row["Type"]) for row in dataset.equipment() if row["Type"] in ["Bot", "Deployable"]]
+
+    salvage_equipment = {}
+    for name in salvage_names:
+        base_name = salvage_base_name(name)
+        salvage_equipment[base_name] = next(
+            ((equipment_name, equipment_type) for equipment_name, equipment_type in equipment
+             if base_name in equipment_name),
+            (base_name, "Equipment")
+        )
+    return salvage_equipment
 
 
-def salvage_base_equipment(name: str) -> Tuple[str, str]:
-    base_name = name[:name.index("(") - 1]
-    with open("data files/Equipment and blueprints.csv") as f:
-        for row in csv.DictReader(f):
-            if base_name in row["Name"] and row["Type"] in ["Bot", "Deployable"]:
-                return row["Name"], row["Type"]
-    return base_name, "Equipment"
+def salvage_base_equipment(name: str, salvage_equipment: SalvageEquipment) -> Tuple[str, str]:
+    base_name = salvage_base_name(name)
+    return salvage_equipment.get(base_name, (base_name, "Equipment"))
 
 
-__all__ = ["run", "force_database_update"]
+__all__ = ["run", "collect_pages", "render_pages", "page_dependencies", "database_titles", "force_database_update"]
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from threading import Event, Lock
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+from .metrics import paused
+
+# Updaters and page batches are mostly waiting on the wiki, so they can share a few threads
+DEFAULT_WORKERS = 5
+
+workers = DEFAULT_WORKERS
+
+# Threads shared by every run_concurrently call, the thread waiting on the tasks is the last worker
+pool: Optional[ThreadPoolExecutor] = None
+pool_lock = Lock()
+
+T = TypeVar("T")
+
+
+class Task:
+    """
+    A task handed to the pool, run by the first thread claiming it: a worker, or the thread waiting for it.
+    """
+    def __init__(self, task: Callable[[], None]):
+        self.task = task
+        self.context = copy_context()
+        self.lock = Lock()
+        self.claimed = False
+        self.done = Event()
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        with self.lock:
+            if self.claimed:
+                return
+            self.claimed = True
+        try:
+            self.context.run(self.task)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+
+def set_concurrency(worker_count: int) -> None:
+    global workers, pool
+    with pool_lock:
+        workers = max(1, worker_count)
+        if pool is not None:
+            pool.shutdown(wait=False)
+            pool = None
+
+
+def worker_pool() -> ThreadPoolExecutor:
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=workers - 1)
+        return pool
+
+
+def split_batches(items: List[T], batch_count: int) -> List[List[T]]:
+    size = -(-len(items) // max(1, batch_count))
+    return [items[i:i + size] for i in range(0, len(items), size)] if items else []
+
+
+def run_concurrently(tasks: Iterable[Callable[[], None]]) -> None:
+    """
+    Run every task on the worker pool and wait until all are done.
+    The first exception raised by a task is raised again here, once every task is done.
+    Tasks run in a copy of the caller's context, so their metrics count for the caller's updater and stage.
+
+    Every call shares the same workers, so tasks starting tasks of their own never use more than workers threads.
+    The calling thread runs the tasks no worker started yet itself,
+    so it only ever waits on running tasks and nested calls can't wait on each other.
+    """
+    tasks = list(tasks)
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            task()
+        return
+
+    handed_out = [Task(task) for task in tasks]
+    executor = worker_pool()
+    for task in handed_out[1:]:
+        executor.submit(task.run)
+    for task in handed_out:
+        task.run()
+    with paused():
+        for task in handed_out:
+            task.done.wait()
+    for task in handed_out:
+        if task.error is not None:
+            raise task.error
+
+
+__all__ = ["set_concurrency", "split_batches", "run_concurrently"]
@@ -1,14 +1,15 @@
-import csv
-from typing import List
+from typing import TYPE_CHECKING, Collection, Dict, List, Optional
 
-from.util import create_page, page_exists, run_template_modifier, database_update
-from mwcleric import TemplateModifierBase
-from mwparserfromhell.nodes import Template
+from . import dataset
+from .dependencies import Source
+from .context import RunContext
+from .metrics import measure_updater, stage
+from .util import InfoboxModifier, create_or_mark_pages, bulk_database_update, render_groups, select_pages
 
-prefix = "Station/"
+if TYPE_CHECKING:
+    from mwparserfromhell.nodes import Template
 
-pages_to_update = []
-data_to_update = {}
+prefix = "Station/"
 
 
 def full_page(sub_page: str) -> str:
@@ -39,13 +40,13 @@ def construct_contract_list(contracts: List[dict]) -> str:
     return "".join(wiki_text)
 
 
-def make_station_page(page: str, data: dict) -> None:
+def render_station_page(data: dict) -> str:
     # Table headers:
     # Name
     # Depth (kkm)
     # Contracts
     # Max Reputation
-    create_page(page, f"""{{{{Stub}}}}
+    return f"""{{{{Stub}}}}
 {{{{Beta content}}}}
 {{{{Station Infobox
 |Station={data["Name"]}
@@ -68,16 +69,18 @@ def make_station_page(page: str, data: dict) -> None:
 The following new upgrades can be unlocked using the resources you can find in this region:
 
 {{{{Main site nav}}}}
-""")
+"""
+
 
+renderers = {"station": render_station_page}
 
-class StationModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
 
-        super().__init__(site, template, **data)
+def render_pages(station_data: Dict[str, dict]) -> Dict[str, str]:
+    return render_groups({"station": station_data}, renderers)
 
-    def update_template(self, template: Template):
+
+class StationModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -85,53 +88,54 @@ class StationModifier(TemplateModifierBase):
 
         print("Updating Station Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Depth", info["Depth (kkm)"])
-        template.add("Refuel Cost", info["Refuel Cost"])
-        template.add("Contracts", construct_contract_list(info["Contracts"]))
-
-
-def run():
-    with open("data files/Stations.csv") as f:
-        # Load all stations
-        station_data = {}
-        for row in csv.DictReader(f):
-            page = full_page(row["Name"])
-            station_data[page] = row
-            station_data[page]["Contracts"] = []
-
-    with open("data files/Contracts.csv") as f:
-        # Load all contracts and link them to their stations
-        for row in csv.DictReader(f):
-            station_data[full_page(row["Station"])]["Contracts"].append(row)
-
-    for page, data in station_data.items():
-        if data["Depth (kkm)"] == "":
-            # Filter not yet released stations
-            continue
-        if page_exists(page):
-            pages_to_update.append(page)
-            data_to_update[page] = data
-        else:
-            make_station_page(page, data)
-
-    if len(pages_to_update) > 0:
-        run_template_modifier(
-            StationModifier,
-            "Station Infobox",
-            pages_to_update,
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Depth", info["Depth (kkm)"])
+        self.set_param(template, "Refuel Cost", info["Refuel Cost"])
+        self.set_param(template, "Contracts", construct_contract_list(info["Contracts"]))
+
+
+def collect_pages() -> Dict[str, dict]:
+    # Load all released stations
+    station_data = {full_page(row["Name"]): dict(row, Contracts=[]) for row in dataset.stations()}
+
+    # Link all contracts to their stations
+    for row in dataset.contracts():
+        page = full_page(row["Station"])
+        if page in station_data:
+            station_data[page]["Contracts"].append(row)
+    return station_data
+
+
+def page_sources(data: dict) -> List[Source]:
+    return [("stations", data["Name"])] + [("contracts", contract["Internal ID"]) for contract in data["Contracts"]]
+
+
+def page_dependencies() -> Dict[str, List[Source]]:
+    return {page: page_sources(data) for page, data in collect_pages().items()}
+
+
+def run(only: Optional[Collection[str]] = None):
+    with measure_updater("stations"), stage("render"):
+        station_data = select_pages(collect_pages(), only)
+
+        with RunContext(["station"]) as context:
+            update_pages(context, station_data)
+
+
+templates = {"station": "Station Infobox"}
+modifiers = {"station": StationModifier}
+
+
+def update_pages(context: RunContext, station_data: Dict[str, dict]):
+    create_or_mark_pages(context, {"station": station_data}, renderers, templates, modifiers)
+
+
+def database_titles() -> List[str]:
+    return [full_page(row["Name"]) for row in dataset.stations()]
 
 
 def force_database_update():
-    with open("data files/Stations.csv") as f:
-        for row in csv.DictReader(f):
-            # Filter empty rows
-            if row["Depth (kkm)"] != "":
-                database_update(full_page(row["Name"]))
+    bulk_database_update(database_titles())
 
 
-__all__ = ["run", "force_database_update"]
+__all__ = ["run", "collect_pages", "render_pages", "page_dependencies", "database_titles", "force_database_update"]
@@ -0,0 +1,186 @@
+import random
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar, Union
+
+T = TypeVar("T")
+A = TypeVar("A")
+
+# Default limits shared by all updaters, change with set_rate_limits
+REQUESTS_PER_SECOND = 10
+EDITS_PER_SECOND = 2
+
+# A limiter halves its rate on every transient error, but never below this part of its ceiling
+MIN_RATE_FRACTION = 1 / 16
+# Every successful call raises the rate by this part of its ceiling, until the ceiling is reached
+RECOVERY_FRACTION = 1 / 20
+
+# Retries of a call failing with a transient error, waiting BACKOFF_BASE * 2 ** attempt seconds in between
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 120.0
+
+
+class TransientError(Exception):
+    """
+    A wiki call failed in a way that will likely succeed later, like replication lag, rate limiting or a 503.
+    The server may tell how long to wait before trying again.
+    """
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Hands out evenly spaced time slots to any number of threads.
+    A thread asking for a slot sleeps until its slot has come.
+
+    The rate adapts to how the wiki holds up: it is halved when the wiki struggles
+    and climbs back to the ceiling one step per successful call when it is healthy again.
+    """
+    def __init__(self, per_second: float):
+        self.lock = Lock()
+        self.next_slot = 0.0
+        self.set_rate(per_second)
+
+    def set_rate(self, per_second: float, max_per_second: Optional[float] = None) -> None:
+        with self.lock:
+            self.max_rate = max(per_second, max_per_second or per_second)
+            self.rate = per_second
+            self.interval = 1 / per_second
+
+    def change_rate(self, per_second: float) -> None:
+        # Call with the lock held
+        self.rate = min(self.max_rate, max(self.max_rate * MIN_RATE_FRACTION, per_second))
+        self.interval = 1 / self.rate
+
+    def slow_down(self) -> None:
+        with self.lock:
+            self.change_rate(self.rate / 2)
+
+    def speed_up(self) -> None:
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.change_rate(self.rate + self.max_rate * RECOVERY_FRACTION)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hand out no slots for the given time, to every thread.
+        """
+        with self.lock:
+            self.next_slot = max(self.next_slot, monotonic() + seconds)
+
+    def wait(self) -> None:
+        with self.lock:
+            now = monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            sleep(slot - now)
+
+
+request_limiter = RateLimiter(REQUESTS_PER_SECOND)
+edit_limiter = RateLimiter(EDITS_PER_SECOND)
+
+
+def set_rate_limits(requests_per_second: float = REQUESTS_PER_SECOND,
+                    edits_per_second: float = EDITS_PER_SECOND,
+                    max_requests_per_second: Optional[float] = None,
+                    max_edits_per_second: Optional[float] = None) -> None:
+    """
+    Set the rates calls start at, and the ceilings they may climb to while the wiki keeps up.
+    Without a ceiling a rate never climbs above where it started.
+    """
+    request_limiter.set_rate(requests_per_second, max_requests_per_second)
+    edit_limiter.set_rate(edits_per_second, max_edits_per_second)
+
+
+def slow_down(limiters: Iterable[RateLimiter] = (request_limiter, edit_limiter),
+              seconds: Optional[float] = None) -> None:
+    """
+    Lower the rates after the wiki reported it is overloaded, and stop all calls for a while if it said how long.
+    """
+    for limiter in limiters:
+        limiter.slow_down()
+        if seconds:
+            limiter.pause(seconds)
+
+
+def backoff(attempt: int, retry_after: Optional[float]) -> float:
+    # Exponential with jitter so threads failing together don't retry together, but never sooner than asked
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+    return max(delay, retry_after or 0.0)
+
+
+def throttled(limiters: Iterable[RateLimiter], call: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Make a call once its limiters hand out a slot, retrying it on transient errors with exponential backoff.
+    Other errors, and a transient error on the last attempt, are raised.
+    """
+    limiters = list(limiters)
+    for attempt in range(MAX_ATTEMPTS):
+        for limiter in limiters:
+            limiter.wait()
+        try:
+            result = call(*args, **kwargs)
+        except TransientError as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            delay = backoff(attempt, e.retry_after)
+            print(f"Wiki call failed ({e}), retrying in {delay:.1f}s...")
+            slow_down(limiters, delay)
+            continue
+        for limiter in limiters:
+            limiter.speed_up()
+        return result
+
+
+def throttled_request(call: Callable[..., T], *args, **kwargs) -> T:
+    return throttled([request_limiter], call, *args, **kwargs)
+
+
+def throttled_requests(call: Callable[[List[A]], List[Union[T, TransientError]]], batches: List[A]) -> List[T]:
+    """
+    Make a call sending many batches at once, once the request limiter handed out a slot for every batch.
+    The batches failing with a transient error are sent again together, with exponential backoff like throttled.
+
+    :return: The result of every batch, in order
+    """
+    results: Dict[int, T] = {}
+    pending = list(range(len(batches)))
+    for attempt in range(MAX_ATTEMPTS):
+        for _ in pending:
+            request_limiter.wait()
+        try:
+            outcomes = call([batches[i] for i in pending])
+        except TransientError as e:
+            outcomes = [e] * len(pending)
+
+        errors = []
+        for i, outcome in zip(pending, outcomes):
+            if isinstance(outcome, TransientError):
+                errors.append(outcome)
+            else:
+                results[i] = outcome
+                request_limiter.speed_up()
+        pending = [i for i, outcome in zip(pending, outcomes) if isinstance(outcome, TransientError)]
+        if not pending:
+            break
+        if attempt == MAX_ATTEMPTS - 1:
+            raise errors[0]
+        delay = backoff(attempt, max(e.retry_after or 0.0 for e in errors))
+        print(f"{len(errors)} wiki calls failed ({errors[0]}), retrying in {delay:.1f}s...")
+        slow_down([request_limiter], delay)
+    return [results[i] for i in range(len(batches))]
+
+
+def throttled_edit(call: Callable[..., T], *args, **kwargs) -> T:
+    # Edits are requests too, so they count towards both limits
+    return throttled([edit_limiter, request_limiter], call, *args, **kwargs)
+
+
+__all__ = [
+    "TransientError", "RateLimiter", "set_rate_limits", "slow_down", "throttled_request", "throttled_requests",
+    "throttled_edit",
+]
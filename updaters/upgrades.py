@@ -1,18 +1,17 @@
-import csv
 from re import search
-from typing import Dict, List
+from typing import TYPE_CHECKING, Collection, Dict, List, Optional
 
-from .util import create_page, page_exists, run_template_modifier, database_update
-from mwcleric import TemplateModifierBase
-from mwparserfromhell.nodes import Template
+from . import dataset
+from .dependencies import Source
+from .context import RunContext
+from .metrics import measure_updater, stage
+from .dataset import Row
+from .util import InfoboxModifier, create_or_mark_pages, bulk_database_update, render_groups, select_pages
 
-prefix = "Upgrade/"
+if TYPE_CHECKING:
+    from mwparserfromhell.nodes import Template
 
-pages_to_update = {
-    "regular": [],
-    "enable": [],
-}
-data_to_update = {}
+prefix = "Upgrade/"
 
 
 def full_page(sub_page: str) -> str:
@@ -70,9 +69,9 @@ def get_steps(entry: Dict[str, str]) -> List[Dict[str, str]]:
     return ret
 
 
-def make_upgrade_page(title: str, entry: Dict[str, str]) -> None:
+def render_upgrade_page(entry: Dict[str, str]) -> str:
     steps = get_steps(entry)
-    create_page(title, f"""{{{{Stub}}}}
+    return f"""{{{{Stub}}}}
 {{{{Beta Content}}}}
 {{{{Upgrade Infobox
 |Name={entry["Name"]}
@@ -89,11 +88,11 @@ def make_upgrade_page(title: str, entry: Dict[str, str]) -> None:
 The required resources limit when you can unlock upgrades. For {entry["Name"]} these are:
 
 {{{{Main site nav}}}}
-""")
+"""
 
 
-def make_upgrade_enable_page(title: str, entry: Dict[str, str]) -> None:
-    create_page(title, f"""{{{{Stub}}}}
+def render_upgrade_enable_page(entry: Dict[str, str]) -> str:
+    return f"""{{{{Stub}}}}
 {{{{Beta content}}}}
 {{{{Upgrade Infobox/Unlock
 |Name={entry["Name"]}
@@ -106,16 +105,22 @@ def make_upgrade_enable_page(title: str, entry: Dict[str, str]) -> None:
 The {entry["Name"]} is a one time upgrade.
 
 {{{{Main site nav}}}}
-""")
+"""
+
+
+# Page group -> function rendering a new page of that group
+renderers = {
+    "regular": render_upgrade_page,
+    "enable": render_upgrade_enable_page,
+}
 
 
-class UpgradeModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
+def render_pages(pages: Dict[str, Dict[str, Row]]) -> Dict[str, str]:
+    return render_groups(pages, renderers)
 
-        super().__init__(site, template, **data)
 
-    def update_template(self, template: Template):
+class UpgradeModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -123,25 +128,20 @@ class UpgradeModifier(TemplateModifierBase):
 
         print("Updating Upgrade Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Description", info["Description"])
-        template.add("Affects", info["Affects"])
-        template.add("Target", upgrade_target(info["Name"]))
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Description", info["Description"])
+        self.set_param(template, "Affects", info["Affects"])
+        self.set_param(template, "Target", upgrade_target(info["Name"]))
 
         steps = get_steps(info)
-        template.add("Levels", ",".join([s["level"] for s in steps]))
-        template.add("Effects", ";;".join([s["effect"] for s in steps]))
-        template.add("Credit Costs", ";;".join([s["credits"] for s in steps]))
-        template.add("Resource Costs", ";;".join([s["resources"] for s in steps]))
+        self.set_param(template, "Levels", ",".join([s["level"] for s in steps]))
+        self.set_param(template, "Effects", ";;".join([s["effect"] for s in steps]))
+        self.set_param(template, "Credit Costs", ";;".join([s["credits"] for s in steps]))
+        self.set_param(template, "Resource Costs", ";;".join([s["resources"] for s in steps]))
 
 
-class UpgradeEnableModifier(TemplateModifierBase):
-    def __init__(self, site, template, new_data, **data):
-        self.new_data = new_data
-
-        super().__init__(site, template, **data)
-
-    def update_template(self, template: Template):
+class UpgradeEnableModifier(InfoboxModifier):
+    def update_template(self, template: "Template"):
         if self.current_page.namespace != 0:
             # don't do anything outside the main namespace
             # for example, we don't want to modify template documentation or user sandboxes
@@ -149,59 +149,52 @@ class UpgradeEnableModifier(TemplateModifierBase):
 
         print("Updating Enable Upgrade Infobox on " + self.current_page.page_title)
         info = self.new_data[self.current_page.page_title]
-        template.add("Name", info["Name"])
-        template.add("Description", info["Description"])
-        template.add("Target", upgrade_target(info["Name"]))
-        template.add("Credits", info["Lvl 1 Credits"])
-        template.add("Resources", get_resources(info, 1))
-
-
-def run():
-    with open("data files/Freighter_Shuttle Upgrades.csv") as f:
-        upgrade_data = {}
-        for row in csv.DictReader(f):
-            page = full_page(row["Name"])
-            upgrade_data[page] = row
-
-    for page, data in upgrade_data.items():
-        if data["Affects"] == "Unlock":
-            if page_exists(page):
-                pages_to_update["enable"].append(page)
-                data_to_update[page] = data
-            else:
-                make_upgrade_enable_page(page, data)
-        else:
-            if page_exists(page):
-                pages_to_update["regular"].append(page)
-                data_to_update[page] = data
-            else:
-                make_upgrade_page(page, data)
-
-    if len(pages_to_update["regular"]) > 0:
-        run_template_modifier(
-            UpgradeModifier,
-            "Upgrade Infobox",
-            pages_to_update["regular"],
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
-
-    if len(pages_to_update["enable"]) > 0:
-        run_template_modifier(
-            UpgradeEnableModifier,
-            "Upgrade Infobox/Unlock",
-            pages_to_update["enable"],
-            "Automatic update from new data, "
-            "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script",
-            new_data=data_to_update
-        )
+        self.set_param(template, "Name", info["Name"])
+        self.set_param(template, "Description", info["Description"])
+        self.set_param(template, "Target", upgrade_target(info["Name"]))
+        self.set_param(template, "Credits", info["Lvl 1 Credits"])
+        self.set_param(template, "Resources", get_resources(info, 1))
+
+
+def collect_pages() -> Dict[str, Dict[str, Row]]:
+    pages = {
+        "regular": {},
+        "enable": {},
+    }
+    for row in dataset.upgrades():
+        pages["enable" if row["Affects"] == "Unlock" else "regular"][full_page(row["Name"])] = row
+    return pages
+
+
+def page_sources(data: Row) -> List[Source]:
+    return [("upgrades", data["Name"])]
+
+
+def page_dependencies() -> Dict[str, List[Source]]:
+    return {page: page_sources(data) for group in collect_pages().values() for page, data in group.items()}
+
+
+def run(only: Optional[Collection[str]] = None):
+    with measure_updater("upgrades"), stage("render"):
+        pages = {group: select_pages(data, only) for group, data in collect_pages().items()}
+        with RunContext(pages.keys()) as context:
+            update_pages(context, pages)
+
+
+templates = {"regular": "Upgrade Infobox", "enable": "Upgrade Infobox/Unlock"}
+modifiers = {"regular": UpgradeModifier, "enable": UpgradeEnableModifier}
+
+
+def update_pages(context: RunContext, pages: Dict[str, Dict[str, Row]]):
+    create_or_mark_pages(context, pages, renderers, templates, modifiers)
+
+
+def database_titles() -> List[str]:
+    return [full_page(row["Name"]) for row in dataset.upgrades()]
 
 
 def force_database_update():
-    with open("data files/Freighter_Shuttle Upgrades.csv") as f:
-        for row in csv.DictReader(f):
-            database_update(full_page(row["Name"]))
+    bulk_database_update(database_titles())
 
 
-__all__ = ["run", "force_database_update"]
+__all__ = ["run", "collect_pages", "render_pages", "page_dependencies", "database_titles", "force_database_update"]
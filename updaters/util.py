@@ -1,35 +1,476 @@
-from typing import List, Optional, Type
-from mwcleric import TemplateModifierBase, WikiggClient
+import os
+from functools import partial
+from itertools import islice
+from threading import Lock
+from typing import (TYPE_CHECKING, Any, Callable, Collection, Dict, Iterable, Iterator, List, Optional, Set, Tuple,
+                    Type, TypeVar)
 
-WIKI_CLIENT: Optional[WikiggClient] = None
+from . import scheduler
+from .budget import defer_updates, out_of_budget, retry_later, spend_edit
+from .context import RunContext
+from .journal import is_done, record_done
+from .metrics import record_outcome, stage
+from .parsing import start_rewrites
+from .pipeline import stream
+from .backend import MISSING, REFRESHED, EditFailed, MwclericBackend, Page, WikiBackend
+from .scheduler import run_concurrently
+from .throttle import TransientError, throttled_edit, throttled_request, throttled_requests
 
+# The wiki client and the parser take long to import, they are only imported once a run needs them
+if TYPE_CHECKING:
+    from mwcleric import WikiggClient
+    from mwparserfromhell.nodes import Template
 
-def set_client(client: WikiggClient):
-    global WIKI_CLIENT
-    WIKI_CLIENT = client
+BACKEND: Optional[WikiBackend] = None
 
+T = TypeVar("T")
 
-def run_template_modifier(modifier: Type[TemplateModifierBase], template: str, pages: List[str], summary: str, **extra):
-    modifier(WIKI_CLIENT, template, title_list=pages, summary=summary, **extra).run()
+# Group, title and data of a page handled by create_or_mark_pages
+PlannedPage = Tuple[str, str, Any]
+
+# The API accepts at most 50 titles per query, revision query or purge for regular accounts
+EXISTENCE_BATCH_SIZE = 50
+PURGE_BATCH_SIZE = 50
+REVISION_BATCH_SIZE = 50
+
+# Edit summary of every infobox update
+UPDATE_SUMMARY = ("Automatic update from new data, "
+                  "see [https://github.com/alikimoko/astronomics-wiki-updater] for update script")
+
+# Page title -> whether the page exists, filled in bulk by prefetch_existence
+existing_pages: Dict[str, bool] = {}
+
+# Outcome of every page handled in the current run
+edit_report: Dict[str, int] = {
+    "created": 0,
+    "updated": 0,
+    "unchanged": 0,
+    "refreshed": 0,
+    "failed": 0,
+    "resumed": 0,
+}
+report_lock = Lock()
+
+# Pages that still failed after the last retry in the current run, see count_failure
+failed_pages: Set[str] = set()
+
+# Directory generated pages are written to instead of the wiki, and whether the wiki is read, see set_output_dir
+output_dir: Optional[str] = None
+read_wiki = False
+
+
+def set_client(client: "WikiggClient"):
+    set_backend(MwclericBackend(client))
+
+
+def set_backend(backend: WikiBackend):
+    """
+    Use another wiki, like a LocalBackend to run the updaters without a live wiki.
+    """
+    global BACKEND
+    BACKEND = backend
+    existing_pages.clear()
+
+
+def set_output_dir(path: Optional[str], read_from_wiki: bool = False) -> None:
+    """
+    Write generated pages to files in this directory instead of saving them on the wiki.
+    Without reading from the wiki nothing is requested from it, so every page is rendered as a new page.
+    Reading from it, pages that exist are fetched and written as the modifiers would save them,
+    pages the modifiers leave unchanged aren't written.
+    """
+    global output_dir, read_wiki
+    output_dir = path
+    read_wiki = read_from_wiki
+    existing_pages.clear()
+
+
+def offline() -> bool:
+    return output_dir is not None and not read_wiki
+
+
+def write_page_file(page: str, content: str) -> None:
+    # Sub pages end up in a directory per prefix, like Asteroid/CC1.wiki
+    path = os.path.join(output_dir, *page.split("/")) + ".wiki"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+class InfoboxModifier:
+    """
+    Updates every use of a template on a list of pages through update_template.
+    Only parameters whose value differs from the new data are changed,
+    pages where every parameter already matches are left alone and counted as unchanged.
+    """
+    def __init__(self, template: str, new_data: dict, title_list: List[str], summary: str):
+        self.template_name = template
+        self.new_data = new_data
+        self.title_list = title_list
+        self.summary = summary
+        self.current_page: Optional[Page] = None
+        self.page_changed = False
+
+    def run(self):
+        for pages in fetch_batches(self.title_list):
+            modify_pages(list(pages.values()), [[self]] * len(pages), self.summary)
+
+    def update_template(self, template: "Template"):
+        raise NotImplementedError()
+
+    def set_param(self, template: "Template", name: str, value: str) -> None:
+        if template.has(name) and str(template.get(name).value).strip() == str(value).strip():
+            return
+        template.add(name, value)
+        self.page_changed = True
+
+    def remove_param(self, template: "Template", name: str) -> None:
+        if template.has(name):
+            template.remove(name)
+            self.page_changed = True
+
+
+def fetch_batches(titles: List[str]) -> Iterator[Dict[str, Page]]:
+    """
+    Fetch pages in order, with one request for every REVISION_BATCH_SIZE pages,
+    every batch in order by the title it was requested as.
+    Only the batches of one read are held at a time, the next read is made when they have been handled.
+    Backends with many reads in flight read several batches at once, see WikiBackend.read_batches.
+    Once the budget is spent the pages not fetched yet are left for the next run, without fetching them.
+    """
+    for batches in read_windows(titles, REVISION_BATCH_SIZE):
+        if out_of_budget([title for batch in batches for title in batch]):
+            continue
+        with stage("fetch"):
+            if len(batches) == 1:
+                fetched = [throttled_request(BACKEND.fetch_many, batches[0])]
+            else:
+                fetched = throttled_requests(BACKEND.fetch_all, batches)
+        for batch, pages in zip(batches, fetched):
+            yield {title: pages[title] for title in batch}
+
+
+def page_batches(pages: List[str]) -> List[List[str]]:
+    # One read of pages per batch, the workers handle the batches side by side
+    size = REVISION_BATCH_SIZE * (BACKEND.read_batches if BACKEND is not None else 1)
+    return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+
+def read_windows(items: Iterable[T], batch_size: int) -> Iterator[List[List[T]]]:
+    # Batches of items, grouped by the batches the backend reads at once
+    per_read = BACKEND.read_batches if BACKEND is not None else 1
+    items = iter(items)
+    while True:
+        window = list(islice(items, batch_size * per_read))
+        if not window:
+            return
+        yield [window[i:i + batch_size] for i in range(0, len(window), batch_size)]
+
+
+def modify_pages(pages: List[Page], modifiers: List[List[InfoboxModifier]], summary: str) -> None:
+    """
+    Let the modifiers of every page update their template on it, parsing the page once and saving it at most once.
+    With parse processes every page of the batch is parsed at the same time, see parsing.set_parse_processes.
+    """
+    rewrites = start_rewrites(pages, modifiers)
+    for page, rewrite in zip(pages, rewrites):
+        if out_of_budget([page.name]):
+            continue
+
+        with stage("parse"):
+            text = rewrite()
+        if text is None:
+            print("Skipping page %s..." % page.name)
+            count_outcome("unchanged")
+            record_done(page.name, page.text)
+            continue
+
+        if output_dir is not None:
+            with stage("save"):
+                write_page_file(page.name, text)
+                count_outcome("updated")
+            continue
+
+        if not spend_edit([page.name]):
+            continue
+        print("Saving page %s..." % page.name)
+        with stage("save"):
+            try:
+                throttled_edit(BACKEND.save, page.name, text, summary, page.revision)
+            except (TransientError, EditFailed) as e:
+                print(f"Saving page {page.name} failed ({e})")
+                count_failure(page.name)
+                continue
+            count_outcome("updated")
+            record_done(page.name, text)
+
+
+def count_outcome(outcome: str) -> None:
+    with report_lock:
+        edit_report[outcome] += 1
+    record_outcome(outcome)
+
+
+def count_failure(page: str) -> None:
+    """
+    Count a page that could not be saved or updated, and leave it for the next run.
+    """
+    with report_lock:
+        failed_pages.add(page)
+    count_outcome("failed")
+    retry_later([page])
+
+
+def reset_report() -> None:
+    with report_lock:
+        for outcome in edit_report:
+            edit_report[outcome] = 0
+        failed_pages.clear()
+
+
+def reset_existence() -> None:
+    """
+    Forget which pages exist, so a new run sees pages created or deleted on the wiki since the last run.
+    """
+    existing_pages.clear()
+
+
+def print_report() -> None:
+    print(", ".join(f"{count} {outcome}" for outcome, count in edit_report.items()))
+    if failed_pages:
+        print("Failed pages: " + ", ".join(sorted(failed_pages)))
+
+
+def run_template_modifier(modifier: Type[InfoboxModifier], template: str, pages: List[str], summary: str, **extra):
+    if defer_updates(pages):
+        return
+
+    def run_batch(batch: List[str]) -> None:
+        # Every batch gets its own modifier, they only share the backend and the rate limits
+        with stage("modify"):
+            modifier(template, title_list=batch, summary=summary, **extra).run()
+
+    run_concurrently(partial(run_batch, batch) for batch in page_batches(pages))
+
+
+def run_template_modifiers(handlers: Dict[str, Callable[..., InfoboxModifier]], pages: Dict[str, List[str]],
+                           summary: str, **extra):
+    """
+    Update several templates in a single pass, every page is loaded once and saved at most once,
+    however many of the templates it has to be updated on.
+
+    :param handlers: Template name -> modifier class updating it, called like the modifier of run_template_modifier
+    :param pages: Template name -> pages to update it on
+    """
+    page_templates: Dict[str, List[str]] = {}
+    for template, titles in pages.items():
+        for title in titles:
+            page_templates.setdefault(title, []).append(template)
+    if defer_updates(page_templates):
+        return
+
+    def run_batch(batch: List[str]) -> None:
+        # Every batch gets its own modifiers, they only share the backend and the rate limits
+        modifiers = {template: handlers[template](template, title_list=[], summary=summary, **extra)
+                     for template in pages}
+        with stage("modify"):
+            for fetched in fetch_batches(batch):
+                page_modifiers = [[modifiers[template] for template in page_templates[title]] for title in fetched]
+                modify_pages(list(fetched.values()), page_modifiers, summary)
+
+    run_concurrently(partial(run_batch, batch) for batch in page_batches(list(page_templates)))
+
+
+def select_pages(pages: Dict[str, T], only: Optional[Collection[str]]) -> Dict[str, T]:
+    """
+    Keep only the given pages, or all of them if no selection is made.
+    Pages a resumed run already finished before it failed are left out.
+    """
+    if only is not None:
+        pages = {page: data for page, data in pages.items() if page in only}
+    return {page: data for page, data in pages.items() if not skip_finished(page)}
+
+
+def skip_finished(page: str) -> bool:
+    if not is_done(page):
+        return False
+    print("Already done: " + page)
+    count_outcome("resumed")
+    return True
+
+
+def prefetch_existence(pages: Iterable[str]) -> None:
+    """
+    Look up which of the given pages exist using multi-title queries and remember the result,
+    so later page_exists calls for these pages don't need a request of their own.
+    Backends with many reads in flight get every query at once, see WikiBackend.read_batches.
+    """
+    if offline():
+        return
+
+    unknown = [page for page in dict.fromkeys(pages) if page not in existing_pages]
+    batches = [unknown[i:i + EXISTENCE_BATCH_SIZE] for i in range(0, len(unknown), EXISTENCE_BATCH_SIZE)]
+    if len(batches) > 1 and BACKEND.read_batches > 1:
+        with stage("existence"):
+            for found in throttled_requests(BACKEND.pages_exist_all, batches):
+                existing_pages.update(found)
+        return
+
+    for batch in batches:
+        with stage("existence"):
+            existing_pages.update(throttled_request(BACKEND.pages_exist, batch))
+
+
+def render_groups(pages: Dict[str, Dict[str, T]], renderers: Dict[str, Callable[[T], str]]) -> Dict[str, str]:
+    """
+    Render every page as a new page, without checking the wiki.
+    """
+    return {page: renderers[group](data) for group, group_pages in pages.items() for page, data in group_pages.items()}
+
+
+def update_marked_pages(context: RunContext, templates: Dict[str, str],
+                        modifiers: Dict[str, Callable[..., InfoboxModifier]]) -> None:
+    """
+    Update the infoboxes of the pages marked in the context, all groups in one pass over the pages.
+
+    :param templates: Page group -> name of the infobox template of that group
+    :param modifiers: Page group -> modifier class updating that template
+    """
+    if not context.data_to_update:
+        return
+    run_template_modifiers(
+        {templates[group]: modifiers[group] for group in context.pages_to_update},
+        {templates[group]: pages for group, pages in context.pages_to_update.items()},
+        UPDATE_SUMMARY,
+        new_data=context.data_to_update
+    )
+
+
+def create_or_mark_pages(context: RunContext, pages: Dict[str, Dict[str, T]], renderers: Dict[str, Callable[[T], str]],
+                         templates: Dict[str, str], modifiers: Dict[str, Callable[..., InfoboxModifier]]) -> None:
+    """
+    Create the pages that don't exist yet and update the others, streaming them through three stages:
+    planning looks up which pages exist a batch at a time and rendering makes the text of every new page,
+    each on a thread of its own, while writing creates the new pages and marks the others on the calling thread.
+    Pages move between the stages a batch of lookups at a time, with only a few batches waiting between two stages,
+    so the first pages are created while later ones are still looked up.
+
+    Once the context holds a full fetch batch of marked pages for every worker they are updated and forgotten,
+    the rest when every page is planned, so the marked pages don't pile up until the end either.
+
+    :param pages: Page group -> page -> data of the page
+    :param renderers: Page group -> function rendering a new page of that group from its data
+    :param templates: Page group -> name of the infobox template of that group, see update_marked_pages
+    :param modifiers: Page group -> modifier class updating that template
+    """
+    planned = ((group, page, data) for group, group_pages in pages.items() for page, data in group_pages.items())
+
+    def plan(put: Callable[[Tuple[List[PlannedPage], List[PlannedPage]]], None]) -> None:
+        with stage("plan"):
+            for batches in read_windows(planned, EXISTENCE_BATCH_SIZE):
+                prefetch_existence(page for batch in batches for _, page, _ in batch)
+                for batch in batches:
+                    new_pages, marked = [], []
+                    for group, page, data in batch:
+                        if page_exists(page):
+                            marked.append((group, page, data))
+                        else:
+                            new_pages.append((group, page, data))
+                    put((new_pages, marked))
+
+    def render(put: Callable[[Tuple[List[Tuple[str, str]], List[PlannedPage]]], None]) -> None:
+        def render_batch(batch: Tuple[List[PlannedPage], List[PlannedPage]]) -> None:
+            new_pages, marked = batch
+            put(([(page, renderers[group](data)) for group, page, data in new_pages], marked))
+
+        with stage("render"):
+            stream(plan, render_batch)
+
+    def write(batch: Tuple[List[Tuple[str, str]], List[PlannedPage]]) -> None:
+        new_pages, marked = batch
+        for page, content in new_pages:
+            create_page(page, content)
+        for group, page, data in marked:
+            context.mark_for_update(group, page, data)
+        if len(context.data_to_update) >= REVISION_BATCH_SIZE * scheduler.workers:
+            update_marked_pages(context, templates, modifiers)
+            context.clear_marked()
+
+    stream(render, write)
+    update_marked_pages(context, templates, modifiers)
+    context.clear_marked()
 
 
 def page_exists(page: str) -> bool:
-    return WIKI_CLIENT.client.pages.get(page).exists
+    if offline():
+        return False
+    if page not in existing_pages:
+        prefetch_existence([page])
+    return existing_pages.get(page, False)
 
 
 def create_page(page: str, content: str):
+    if output_dir is not None:
+        with stage("save"):
+            write_page_file(page, content)
+            count_outcome("created")
+        return
+
+    if not spend_edit([page]):
+        return
     print("Creating page: " + page)
-    WIKI_CLIENT.save_title(
-        page,
-        content,
-        summary="Automated page creation, "
-                "see [https://github.com/alikimoko/astronomics-wiki-updater] "
-                "for update script"
-    )
+    with stage("save"):
+        try:
+            throttled_edit(
+                BACKEND.save,
+                page,
+                content,
+                summary="Automated page creation, "
+                        "see [https://github.com/alikimoko/astronomics-wiki-updater] "
+                        "for update script"
+            )
+        except (TransientError, EditFailed) as e:
+            print(f"Creating page {page} failed ({e})")
+            count_failure(page)
+            return
+        existing_pages[page] = True
+        count_outcome("created")
+        record_done(page, content)
 
 
-def database_update(page: str) -> None:
-    if not page_exists(page):
-        return
-    print("Forcing database update for page: " + page)
-    WIKI_CLIENT.touch_title(page)
+def bulk_database_update(pages: Iterable[str]) -> Dict[str, str]:
+    """
+    Force a database update for many pages at once, by purging them in batches with a forced links update.
+    Pages that don't exist are reported as missing by the purge and skipped.
+
+    :return: The pages that could not be updated, with the reason why
+    """
+    pages = [page for page in dict.fromkeys(pages) if not skip_finished(page)]
+    failures: Dict[str, str] = {}
+
+    def purge(batch: List[str]) -> None:
+        if not spend_edit(batch):
+            return
+        with stage("touch"):
+            try:
+                statuses = throttled_edit(BACKEND.purge, batch)
+            except TransientError as e:
+                statuses = {page: str(e) for page in batch}
+            for page, status in statuses.items():
+                if status == MISSING:
+                    existing_pages[page] = False
+                    record_done(page)
+                elif status == REFRESHED:
+                    print("Forced database update for page: " + page)
+                    count_outcome("refreshed")
+                    record_done(page)
+                else:
+                    failures[page] = status
+
+    run_concurrently(partial(purge, pages[i:i + PURGE_BATCH_SIZE]) for i in range(0, len(pages), PURGE_BATCH_SIZE))
+
+    with stage("touch"):
+        for page, reason in failures.items():
+            print(f"Database update failed for page: {page} ({reason})")
+            count_failure(page)
+    return failures
@@ -0,0 +1,125 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+from time import monotonic, sleep
+from typing import Dict, Optional, Set, Tuple
+
+# inotify event flags, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = 0x800
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Watcher:
+    """
+    Reports which files in a directory changed.
+    """
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Wait until files changed, or until the timeout passes.
+
+        :return: Names of the files that changed, empty when the timeout passed first
+        """
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(Watcher):
+    """
+    Gets told about changes by the Linux kernel.
+    """
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Editors and exports either write the file in place or replace it
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Can't watch {directory}")
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            changed.add(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+            offset += length
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher(Watcher):
+    """
+    Compares the modification time and size of every file at an interval, for systems without inotify.
+    """
+    def __init__(self, directory: str, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self.state = self.scan()
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    state[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            state = self.scan()
+            changed = {name for name in state.keys() | self.state.keys() if state.get(name) != self.state.get(name)}
+            self.state = state
+            if changed:
+                return changed
+            if deadline is not None and monotonic() >= deadline:
+                return set()
+            sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - monotonic())))
+
+
+def make_watcher(directory: str, poll_interval: float = 1.0) -> Watcher:
+    """
+    Watch with inotify where it is available, and fall back to polling elsewhere.
+    """
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError, TypeError):
+        # No inotify on this system, or no C library to find it in
+        return PollingWatcher(directory, poll_interval)
+
+
+def wait_for_changes(watcher: Watcher, debounce: float) -> Set[str]:
+    """
+    Wait for files to change, then keep collecting changes until none came in for the debounce time.
+    Exports write the sheets one after another, they should be handled as a single change.
+    """
+    changed = watcher.wait()
+    while True:
+        more = watcher.wait(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+__all__ = ["Watcher", "InotifyWatcher", "PollingWatcher", "make_watcher", "wait_for_changes"]